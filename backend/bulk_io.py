@@ -0,0 +1,141 @@
+import io
+import csv
+import codecs
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Set, Type
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+
+BATCH_SIZE = 1000
+# Conflict/error entries listed in the import report (the counts are always complete)
+MAX_REPORTED_ROWS = 1000
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def request_format(request: Request) -> str:
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or "x-json-stream" in content_type:
+        return "ndjson"
+    raise HTTPException(status_code=415, detail="Upload must be text/csv or application/x-ndjson")
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    """Decodes the request body as it arrives and yields complete lines (with line endings)."""
+    # Incremental decoding: a multi-byte character may be split across chunks
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith(("\n", "\r")) else ""
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_records(request: Request, fmt: str) -> AsyncIterator[Any]:
+    """Yields one dict per CSV row / NDJSON line, or the exception raised while parsing it."""
+    header = None
+    record = ""
+    async for line in _iter_lines(request):
+        if fmt == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield e
+            continue
+
+        # A quoted CSV field may contain newlines: collect lines until the quotes balance
+        record += line
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        # Empty CSV cells are missing values
+        yield {name: (value if value != "" else None) for name, value in zip(header, values)}
+    if record:
+        yield ValueError("Unterminated quoted CSV field")
+
+
+async def import_records(request: Request, schema: Type[BaseModel], key_field: str,
+                         insert_batch: Callable[[List[BaseModel]], Set[Any]]) -> Dict[str, Any]:
+    """
+    Streams a CSV/NDJSON upload into `insert_batch` in batches of BATCH_SIZE validated rows
+    (the batch insert runs in the threadpool). Returns counts plus per-row conflicts and errors,
+    where `row` is the 1-based data row in the upload.
+    """
+    fmt = request_format(request)
+    report: Dict[str, Any] = {"inserted": 0, "conflict_count": 0, "error_count": 0, "conflicts": [], "errors": []}
+    batch: List[BaseModel] = []
+    batch_rows: List[int] = []
+
+    async def flush():
+        inserted = await run_in_threadpool(insert_batch, batch)
+        report["inserted"] += len(inserted)
+        for row_number, item in zip(batch_rows, batch):
+            key = getattr(item, key_field)
+            if key in inserted:
+                # A later duplicate of the same key in this batch is a conflict
+                inserted.discard(key)
+                continue
+            report["conflict_count"] += 1
+            if len(report["conflicts"]) < MAX_REPORTED_ROWS:
+                report["conflicts"].append({"row": row_number, key_field: key})
+        batch.clear()
+        batch_rows.clear()
+
+    row_number = 0
+    async for record in iter_records(request, fmt):
+        row_number += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append(schema.model_validate(record))
+            batch_rows.append(row_number)
+        except (ValueError, ValidationError) as e:
+            report["error_count"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ROWS:
+                report["errors"].append({"row": row_number, "error": str(e)})
+            continue
+        if len(batch) >= BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return report
+
+
+def export_lines(rows: Iterable[Any], schema: Type[BaseModel], fmt: str) -> Iterator[str]:
+    """Encodes rows as CSV or NDJSON, yielding about BATCH_SIZE rows per chunk."""
+    columns = list(schema.model_fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(columns)
+
+    count = 0
+    for row in rows:
+        values = [getattr(row, column) for column in columns]
+        if fmt == "csv":
+            writer.writerow(["" if v is None else v for v in values])
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False))
+            buffer.write("\n")
+        count += 1
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
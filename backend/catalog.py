@@ -0,0 +1,160 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from . import crud, models
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the catalog's version row, which picks up SystemInfo writes made
+# by other workers or processes; 0 disables the check (single worker)
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", "2"))
+
+
+@dataclass(frozen=True)
+class SystemEntry:
+    """Parsed, read-only view of one SystemInfo row."""
+    system_name: str
+    data_query_function_name: str
+    filterable_columns: Tuple[str, ...]
+    filterable_columns_raw: Optional[str]
+    frontend_route_name: Optional[str]
+
+
+@dataclass
+class CatalogSnapshot:
+    """Immutable catalog contents for one version, plus derived per-version values."""
+    # The catalog's row in data_versions, so every worker uses the same number for the same contents
+    version: int
+    systems: Tuple[SystemEntry, ...]
+    # Per-version memo for values derived from the snapshot (e.g. the rendered system prompt)
+    derived: Dict[str, object] = field(default_factory=dict)
+
+    def by_function(self, function_name: str) -> Optional[SystemEntry]:
+        return next((s for s in self.systems if s.data_query_function_name == function_name), None)
+
+    def by_system_name(self, system_name: str) -> Optional[SystemEntry]:
+        return next((s for s in self.systems if s.system_name == system_name), None)
+
+
+def _parse_entry(info) -> SystemEntry:
+    columns: List[str] = []
+    if info.filterable_columns:
+        try:
+            parsed = json.loads(info.filterable_columns)
+            if isinstance(parsed, list):
+                columns = [str(c) for c in parsed]
+        except json.JSONDecodeError:
+            pass
+    return SystemEntry(
+        system_name=info.system_name,
+        data_query_function_name=info.data_query_function_name,
+        filterable_columns=tuple(columns),
+        filterable_columns_raw=info.filterable_columns,
+        frontend_route_name=info.frontend_route_name,
+    )
+
+
+class SystemInfoCatalog:
+    """
+    In-memory cache of the SystemInfo table.
+
+    The table is read once and kept until `invalidate()` is called by a write
+    (create/delete system_info) in this worker, or `watch()` sees that another worker
+    changed it. Snapshots carry the catalog's shared version counter (crud.versions),
+    which other caches, including ones shared between workers, use as part of their keys.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Local invalidation count, to drop a load that raced with an invalidation
+        self._generation = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._load_flight = SingleFlight(enabled=True)
+        self._counters = {"loads": 0, "remote_changes": 0}
+
+    @property
+    def version(self) -> int:
+        """Version of the loaded snapshot; -1 while none is loaded."""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else -1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """For sync code in a worker thread (startup, `check`); request handlers use `get_async`."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        # No lock is held across the read: a load racing with another one is duplicated
+        # (the table is small), never waited on
+        return self._load(db)
+
+    def _load(self, db: Session) -> CatalogSnapshot:
+        generation = self._generation
+        # Version first: a write landing in between makes the snapshot look stale, never current
+        version = crud.get_version(db, models.SystemInfo.__tablename__)
+        systems = tuple(_parse_entry(info) for info in crud.get_all_system_info(db, limit=None))
+        snapshot = CatalogSnapshot(version=version, systems=systems)
+        with self._lock:
+            self._counters["loads"] += 1
+            # An invalidation that raced with the read leaves the snapshot unset
+            if self._generation == generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    async def get_async(self, db) -> CatalogSnapshot:
+        """`get` for async handlers: `db` is an AsyncSession/ThreadedSession (or a plain Session)."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        if isinstance(db, Session):
+            load = lambda: asyncio.to_thread(self._load, db)
+        else:
+            load = lambda: db.run_sync(self._load)
+        # Concurrent loads on the event loop are coalesced instead of serialized by a lock
+        return await self._load_flight.do(self._generation, load)
+
+    def check(self, db: Session) -> bool:
+        """Drops the snapshot when the catalog's version row moved (a write by another worker)."""
+        snapshot = self._snapshot
+        if snapshot is None or crud.get_version(db, models.SystemInfo.__tablename__) == snapshot.version:
+            return False
+        logger.info("Catalog changed in another worker (version %d), reloading.", snapshot.version)
+        self._counters["remote_changes"] += 1
+        self.invalidate()
+        return True
+
+    async def watch(self, session_factory: Callable[[], Session], interval: float = CATALOG_POLL_INTERVAL) -> None:
+        """Runs `check` every `interval` seconds until cancelled (started by the app at startup)."""
+        def check() -> None:
+            db = session_factory()
+            try:
+                self.check(db)
+            finally:
+                db.close()
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(check)
+            except Exception:
+                logger.warning("Catalog version check failed", exc_info=True)
+
+    def stats(self) -> Dict[str, object]:
+        snapshot = self._snapshot
+        stats: Dict[str, object] = dict(self._counters)
+        stats["version"] = self.version
+        stats["systems"] = len(snapshot.systems) if snapshot is not None else 0
+        return stats
+
+
+catalog = SystemInfoCatalog()
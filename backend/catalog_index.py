@@ -0,0 +1,160 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from . import crud
+from .catalog import CatalogSnapshot, SystemEntry
+from .response_cache import normalize_prompt
+
+# Systems put into the intent prompt per question; smaller catalogs are always sent whole
+CATALOG_TOP_K = int(os.getenv("CATALOG_TOP_K", "8"))
+
+# Chinese words for the English column names, so "住在台北的員工" can match `address`
+COLUMN_ALIASES: Dict[str, str] = {
+    "name": "姓名 名字 叫",
+    "address": "地址 住址 住在 城市 地區",
+    "phone": "電話 手機",
+    "email": "信箱 郵件 電子郵件",
+    "gender": "性別 男 女",
+    "age": "年齡 歲",
+    "order_id": "訂單編號 單號",
+    "order_date": "日期 年 月 時間",
+    "order_amount": "金額 價格 營收 業績",
+    "employee_id": "員工編號 工號",
+}
+# Extra terms for the aggregate functions (see crud.AGGREGATE_TOOLS)
+AGGREGATE_TERMS = "統計 總計 總和 加總 合計 平均 最大 最高 最小 最低 數量 幾筆 多少 分組 每月 每個"
+# Extra terms for the semantic search functions (see crud.SEARCH_TOOLS)
+SEARCH_TERMS = "搜尋 找 類似 相似 相關 像 模糊 大概 好像"
+
+_WORD_RE = re.compile(r"[a-z0-9]+|[㐀-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Latin words and numbers as they are, CJK runs as overlapping character bigrams."""
+    tokens: List[str] = []
+    for word in _WORD_RE.findall(normalize_prompt(text).replace("_", " ")):
+        if word.isascii() or len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def entry_text(entry: SystemEntry) -> str:
+    """What a catalog entry is retrieved by; the system name counts twice."""
+    parts = [entry.system_name, entry.system_name, entry.data_query_function_name, entry.frontend_route_name or ""]
+    for column in entry.filterable_columns:
+        parts += [column, COLUMN_ALIASES.get(column, "")]
+    if entry.data_query_function_name in crud.AGGREGATE_TOOLS:
+        parts.append(AGGREGATE_TERMS)
+    if entry.data_query_function_name in crud.SEARCH_TOOLS:
+        parts.append(SEARCH_TERMS)
+    return " ".join(parts)
+
+
+class CatalogIndex:
+    """
+    In-memory BM25 index over the SystemInfo catalog, used to put only the systems relevant
+    to a question into the intent prompt.
+
+    The index follows the catalog version: on the first search after a /api/system_info/ write,
+    only the entries that were added, removed or changed are re-indexed.
+    """
+
+    def __init__(self, top_k: int = CATALOG_TOP_K, k1: float = 1.5, b: float = 0.75):
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._version = -1
+        # system name -> (entry, document length); term -> {system name: term frequency}
+        self._docs: Dict[str, Tuple[SystemEntry, int]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._counters = {"searches": 0, "narrowed": 0, "no_match": 0, "indexed": 0, "removed": 0}
+
+    def _add(self, entry: SystemEntry) -> None:
+        frequencies = Counter(tokenize(entry_text(entry)))
+        length = sum(frequencies.values())
+        self._docs[entry.system_name] = (entry, length)
+        self._total_length += length
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[entry.system_name] = frequency
+        self._counters["indexed"] += 1
+
+    def _remove(self, system_name: str) -> None:
+        entry, length = self._docs.pop(system_name)
+        self._total_length -= length
+        for term in set(tokenize(entry_text(entry))):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(system_name, None)
+                if not postings:
+                    del self._postings[term]
+        self._counters["removed"] += 1
+
+    def _sync(self, snapshot: CatalogSnapshot) -> None:
+        if self._version == snapshot.version:
+            return
+        current = {entry.system_name: entry for entry in snapshot.systems}
+        for system_name in list(self._docs):
+            if current.get(system_name) != self._docs[system_name][0]:
+                self._remove(system_name)
+        for system_name, entry in current.items():
+            if system_name not in self._docs:
+                self._add(entry)
+        self._version = snapshot.version
+
+    def _scores(self, query: str) -> Dict[str, float]:
+        count = len(self._docs)
+        average_length = self._total_length / count if count else 0.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for system_name, frequency in postings.items():
+                length = self._docs[system_name][1]
+                norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[system_name] = scores.get(system_name, 0.0) + idf * frequency * (self.k1 + 1) / norm
+        return scores
+
+    def search(self, snapshot: CatalogSnapshot, query: str, k: int) -> List[Tuple[SystemEntry, float]]:
+        """The `k` best matching entries with their BM25 scores (entries scoring 0 are left out)."""
+        with self._lock:
+            self._sync(snapshot)
+            scores = self._scores(query)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._docs[system_name][0], score) for system_name, score in best]
+
+    def select(self, snapshot: CatalogSnapshot, query: str) -> Tuple[SystemEntry, ...]:
+        """
+        Systems to describe in the prompt for `query`, in catalog order: all of them when the
+        catalog has at most `top_k` entries or nothing matches, otherwise the `top_k` best matches.
+        """
+        with self._lock:
+            self._counters["searches"] += 1
+        if len(snapshot.systems) <= self.top_k:
+            return snapshot.systems
+        matched = {entry.system_name for entry, _ in self.search(snapshot, query, self.top_k)}
+        with self._lock:
+            self._counters["narrowed" if matched else "no_match"] += 1
+        if not matched:
+            return snapshot.systems
+        return tuple(entry for entry in snapshot.systems if entry.system_name in matched)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats: Dict[str, object] = dict(self._counters)
+            stats["documents"] = len(self._docs)
+            stats["terms"] = len(self._postings)
+        stats["top_k"] = self.top_k
+        return stats
+
+
+catalog_index = CatalogIndex()
@@ -0,0 +1,144 @@
+import io
+import os
+import csv
+from typing import Any, Dict, List, Optional
+from .serialization import RowSet
+
+# Approximate token budget for all tool data sent to the summarization call
+TOKEN_BUDGET = int(os.getenv("QNA_TOKEN_BUDGET", "4000"))
+# Columns that never help answer a question (internal primary keys)
+INTERNAL_COLUMNS = ("id",)
+# Number of most common values reported for text columns
+TOP_VALUES = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: one per CJK character, one per ~4 other characters."""
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def column_stats(column_values: List[Any], include_text: bool) -> Optional[Dict[str, Any]]:
+    values = [v for v in column_values if v is not None]
+    if not values:
+        return None
+    if all(_is_number(v) for v in values):
+        total = sum(values)
+        return {"min": min(values), "max": max(values), "sum": total, "avg": round(total / len(values), 2)}
+    if not include_text:
+        return None
+    counts: Dict[str, int] = {}
+    for value in values:
+        counts[str(value)] = counts.get(str(value), 0) + 1
+    top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:TOP_VALUES]
+    return {"distinct": len(counts), "top": dict(top)}
+
+
+def _csv_line(values: List[Any]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(["" if v is None else v for v in values])
+    return buffer.getvalue()
+
+
+def compact_rows(rows: Any, budget_tokens: int, truncated: bool = False) -> Dict[str, Any]:
+    """
+    Encodes a RowSet (or a list of row dicts) as CSV (column names once instead of per row)
+    within `budget_tokens`. Internal, all-empty and constant columns are dropped (constants are
+    reported once), numeric columns get min/max/sum/avg over all the returned rows, and rows
+    beyond the budget are cut with `shown_rows` / `total_rows` stating how many were kept.
+    `truncated` (more rows matched than the tool returned) is passed on as a flag.
+    """
+    if not isinstance(rows, RowSet):
+        if not rows or not all(isinstance(row, dict) for row in rows):
+            return {"format": "json", "total_rows": len(rows), "rows": rows}
+        rows = RowSet.from_dicts(rows)
+    if not rows.rows:
+        return {"format": "json", "total_rows": 0, "rows": []}
+
+    total = len(rows)
+    # Work column-wise on the row tuples, without building a dict per row
+    by_column = dict(zip(rows.columns, zip(*rows.rows)))
+    constants: Dict[str, Any] = {}
+    kept_columns = []
+    for column, column_values in by_column.items():
+        if column in INTERNAL_COLUMNS:
+            continue
+        values = set(column_values)
+        if values == {None}:
+            continue
+        if total > 1 and len(values) == 1:
+            constants[column] = values.pop()
+            continue
+        kept_columns.append(column)
+
+    compacted: Dict[str, Any] = {"format": "csv", "total_rows": total, "columns": kept_columns}
+    if truncated:
+        compacted["truncated"] = True
+    if constants:
+        compacted["constant_columns"] = constants
+
+    header = _csv_line(kept_columns)
+    lines = [_csv_line(list(values)) for values in zip(*(by_column[c] for c in kept_columns))]
+    remaining = budget_tokens - estimate_tokens(header) - estimate_tokens(str(constants))
+
+    stats = {}
+    if total > 1:
+        # Text stats are only worth their tokens when not every row fits
+        truncated = sum(estimate_tokens(line) for line in lines) > remaining
+        for column in kept_columns:
+            column_stat = column_stats(by_column[column], include_text=truncated)
+            if column_stat:
+                stats[column] = column_stat
+        if stats:
+            compacted["stats"] = stats
+            remaining -= estimate_tokens(str(stats))
+
+    shown = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        remaining -= cost
+        shown += 1
+
+    compacted["shown_rows"] = shown
+    compacted["rows"] = header + "".join(lines[:shown])
+    return compacted
+
+
+def compact_tool_results(results: List[Dict[str, Any]], budget_tokens: int = TOKEN_BUDGET,
+                         filter_hints: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Splits the budget evenly over the results that carry data and compacts each of them.
+    When rows had to be cut (or the tool itself returned only the first rows, `truncated`), a
+    note with the function's filterable columns (from `filter_hints`) is attached so the answer
+    can suggest a narrower question, or an aggregate one for totals.
+    """
+    data_results = [r for r in results if "data" in r]
+    per_result_budget = budget_tokens // max(len(data_results), 1)
+    compacted = []
+    for result in results:
+        if "data" not in result:
+            compacted.append(result)
+            continue
+        data = compact_rows(result["data"], per_result_budget, truncated=result.get("truncated", False))
+        entry = {key: value for key, value in result.items() if key != "truncated"}
+        entry["data"] = data
+        total = data["total_rows"]
+        notes = []
+        if data.get("truncated"):
+            notes.append(
+                f"符合條件的資料超過 {total} 筆，只取回了前 {total} 筆，stats 只涵蓋這些資料；"
+                f"全部資料的筆數、總和或平均需改用統計函數查詢。"
+            )
+        if data.get("shown_rows", total) < total:
+            notes.append(f"僅提供 {data['shown_rows']}/{total} 筆資料 (stats 為這 {total} 筆的統計)。")
+        if notes:
+            hint = (filter_hints or {}).get(result.get("function_name")) or "無"
+            entry["note"] = "".join(notes) + f"如需逐筆明細，可建議用戶以這些欄位篩選: {hint}"
+        compacted.append(entry)
+    return compacted
@@ -1,13 +1,21 @@
 from .employee import (
     get_employee,
     get_employees,
+    get_employees_page,
+    iter_employees,
+    aggregate_employees,
     create_employee,
+    bulk_create_employees,
     delete_employee,
 )
 from .order import (
     get_order,
     get_orders,
+    get_orders_page,
+    iter_orders,
+    aggregate_orders,
     create_order,
+    bulk_create_orders,
     delete_order,
 )
 from .system_info import (
@@ -16,3 +24,17 @@ from .system_info import (
     create_system_info,
     delete_system_info,
 )
+from .semantic import (
+    SEARCH_TOOLS,
+    search_employees,
+    search_orders,
+    sync_index,
+    check_row_ids,
+)
+from .aggregate import AGGREGATE_TOOLS, AGGREGATE_METRICS
+from .tools import TOOLS, TOOL_ROW_LIMIT, ToolSpec, register_tool
+from .versions import bump_version, get_version
+from .filters import check_filterable, compile_filters
+from .pagination import Page
+from .projection import Rows, select_rows
+from . import aio
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from .filters import apply_filters
+
+AGGREGATE_METRICS = {
+    "count": func.count,
+    "sum": func.sum,
+    "avg": func.avg,
+    "min": func.min,
+    "max": func.max,
+}
+MAX_GROUPS = 50
+
+# Aggregate tool functions and the columns the LLM may use with them.
+# Used both for validation and to describe the tools in the system prompt.
+AGGREGATE_TOOLS: Dict[str, Dict[str, List[str]]] = {}
+
+
+def aggregate(
+    db: Session,
+    model,
+    value_columns: Dict[str, Any],
+    group_columns: Dict[str, Any],
+    filters: Optional[Dict[str, Any]] = None,
+    metric: str = "count",
+    column: Optional[str] = None,
+    group_by: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Computes `metric(column)` in the database, optionally grouped by one column,
+    so only a handful of numbers are returned regardless of table size.
+    `value_columns` / `group_columns` map the whitelisted names to SQL expressions.
+    """
+    metric = (metric or "count").lower()
+    if metric not in AGGREGATE_METRICS:
+        raise ValueError(f"Unsupported metric '{metric}', expected one of {list(AGGREGATE_METRICS)}")
+    if metric == "count" and not column:
+        value_expr = func.count()
+    else:
+        if column not in value_columns:
+            raise ValueError(f"Column '{column}' cannot be aggregated, expected one of {list(value_columns)}")
+        value_expr = AGGREGATE_METRICS[metric](value_columns[column])
+    if group_by and group_by not in group_columns:
+        raise ValueError(f"Cannot group by '{group_by}', expected one of {list(group_columns)}")
+
+    group_expr = group_columns[group_by].label(group_by) if group_by else None
+    columns = [group_expr, value_expr.label("value")] if group_by else [value_expr.label("value")]
+    query = apply_filters(db.query(*columns).select_from(model), model, filters)
+
+    if not group_by:
+        value = query.scalar()
+        return [{"metric": metric, "column": column, "value": _to_number(value)}]
+
+    rows = query.group_by(group_expr).order_by(value_expr.desc()).limit(MAX_GROUPS).all()
+    return [
+        {group_by: row[0], "metric": metric, "column": column, "value": _to_number(row[1])}
+        for row in rows
+    ]
+
+
+def _to_number(value):
+    if value is None:
+        return None
+    if isinstance(value, (float, Decimal)):
+        return round(float(value), 2)
+    return value
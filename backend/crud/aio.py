@@ -0,0 +1,42 @@
+"""
+Async counterparts of the crud functions, for async request handlers.
+
+Each function takes an AsyncSession (or `database.ThreadedSession`) instead of a Session and
+runs the sync implementation through `run_sync`: on aiosqlite/asyncpg the queries are awaited
+on the event loop, so the filter, paging and aggregate logic exists only once.
+Generators (iter_employees/iter_orders) have no counterpart; exports stream from the threadpool.
+"""
+import functools
+from typing import Any, Awaitable, Callable
+from . import employee, order, system_info, projection
+
+
+def _awaitable(func: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+    @functools.wraps(func)
+    async def wrapper(db, *args, **kwargs):
+        return await db.run_sync(func, *args, **kwargs)
+    return wrapper
+
+
+get_employee = _awaitable(employee.get_employee)
+get_employees = _awaitable(employee.get_employees)
+get_employees_page = _awaitable(employee.get_employees_page)
+aggregate_employees = _awaitable(employee.aggregate_employees)
+create_employee = _awaitable(employee.create_employee)
+bulk_create_employees = _awaitable(employee.bulk_create_employees)
+delete_employee = _awaitable(employee.delete_employee)
+
+get_order = _awaitable(order.get_order)
+get_orders = _awaitable(order.get_orders)
+get_orders_page = _awaitable(order.get_orders_page)
+aggregate_orders = _awaitable(order.aggregate_orders)
+create_order = _awaitable(order.create_order)
+bulk_create_orders = _awaitable(order.bulk_create_orders)
+delete_order = _awaitable(order.delete_order)
+
+get_system_info = _awaitable(system_info.get_system_info)
+get_all_system_info = _awaitable(system_info.get_all_system_info)
+create_system_info = _awaitable(system_info.create_system_info)
+delete_system_info = _awaitable(system_info.delete_system_info)
+
+select_rows = _awaitable(projection.select_rows)
@@ -0,0 +1,45 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Set
+from .versions import bump_version
+
+
+def _insert_ignoring_conflicts(db: Session, model):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    return None
+
+
+def bulk_insert(db: Session, model, key_column: str, rows: List[Dict[str, Any]]) -> Set[Any]:
+    """
+    Inserts `rows` with one multi-row INSERT ... ON CONFLICT DO NOTHING and a single commit.
+    Returns the keys that were inserted; rows that hit a unique constraint (including
+    duplicates within the batch) are skipped and can be reported by the caller.
+    """
+    if not rows:
+        return set()
+    key = getattr(model, key_column)
+    stmt = _insert_ignoring_conflicts(db, model)
+    if stmt is not None:
+        inserted = {row[0] for row in db.execute(stmt.returning(key), rows)}
+        if inserted:
+            bump_version(db, model.__tablename__)
+        db.commit()
+        return inserted
+
+    # Other databases: plain executemany after dropping keys that already exist
+    existing = {row[0] for row in db.query(key).filter(key.in_([r[key_column] for r in rows]))}
+    new_rows, seen = [], set()
+    for row in rows:
+        if row[key_column] not in existing and row[key_column] not in seen:
+            seen.add(row[key_column])
+            new_rows.append(row)
+    if new_rows:
+        db.execute(insert(model), new_rows)
+        bump_version(db, model.__tablename__)
+    db.commit()
+    return seen
@@ -1,24 +1,58 @@
+import logging
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, List, Set
 from .. import models, schemas
+from .aggregate import aggregate, AGGREGATE_TOOLS
+from .filters import apply_filters
+from .pagination import Page, keyset_page, iter_keyset
+from .bulk import bulk_insert
+from .tools import register_tool
+from .versions import bump_version
+from . import semantic
+
+logger = logging.getLogger(__name__)
 
 def get_employee(db: Session, employee_id: str):
     return db.query(models.Employee).filter(models.Employee.employee_id == employee_id).first()
 
+@register_tool(models.Employee, schemas.Employee, projection=True)
 def get_employees(db: Session, filters: Dict[str, Any] = None, skip: int = 0, limit: int = 100):
-    query = db.query(models.Employee)
-    if filters:
-        for column, value in filters.items():
-            if hasattr(models.Employee, column):
-                # Use 'like' for partial string matching
-                query = query.filter(getattr(models.Employee, column).like(f"%{value}%"))
+    query = apply_filters(db.query(models.Employee), models.Employee, filters)
 
     employees = query.offset(skip).limit(limit).all()
-    print(f"Debug: get_employees - Retrieved {len(employees)} employees with filters {filters}. First: {employees[0].__dict__ if employees else 'None'}")
+    logger.debug("get_employees - Retrieved %d employees with filters %s", len(employees), filters)
     return employees
 
+# Indexed columns the list endpoint can page by
+EMPLOYEE_SORT_KEYS = ("id", "employee_id", "name")
+
+def get_employees_page(db: Session, filters: Dict[str, Any] = None, cursor: str = None,
+                       sort: str = "id", limit: int = 100) -> Page:
+    query = apply_filters(db.query(models.Employee), models.Employee, filters)
+    return keyset_page(query, models.Employee, EMPLOYEE_SORT_KEYS, sort=sort, cursor=cursor, limit=limit)
+
+def iter_employees(db: Session, filters: Dict[str, Any] = None, batch_size: int = 1000):
+    query = apply_filters(db.query(models.Employee), models.Employee, filters)
+    return iter_keyset(query, models.Employee, batch_size=batch_size)
+
+EMPLOYEE_VALUE_COLUMNS = {"age": models.Employee.age}
+EMPLOYEE_GROUP_COLUMNS = {
+    "gender": models.Employee.gender,
+    "address": models.Employee.address,
+    "age": models.Employee.age,
+}
+AGGREGATE_TOOLS["aggregate_employees"] = {
+    "columns": list(EMPLOYEE_VALUE_COLUMNS),
+    "group_by": list(EMPLOYEE_GROUP_COLUMNS),
+}
+
+@register_tool(models.Employee)
+def aggregate_employees(db: Session, filters: Dict[str, Any] = None, metric: str = "count",
+                        column: str = None, group_by: str = None):
+    return aggregate(db, models.Employee, EMPLOYEE_VALUE_COLUMNS, EMPLOYEE_GROUP_COLUMNS,
+                     filters=filters, metric=metric, column=column, group_by=group_by)
+
 def create_employee(db: Session, employee: schemas.EmployeeCreate):
-    print(f"Debug: create_employee - Incoming data: {employee.model_dump()}")
     db_employee = models.Employee(
         employee_id=employee.employee_id,
         name=employee.name,
@@ -29,15 +63,27 @@ def create_employee(db: Session, employee: schemas.EmployeeCreate):
         age=employee.age        # Added age field
     )
     db.add(db_employee)
+    bump_version(db, models.Employee.__tablename__)
     db.commit()
     db.refresh(db_employee)
-    print(f"Debug: create_employee - Saved db_employee: {db_employee.__dict__}")
+    semantic.index_rows(models.Employee, [db_employee])
+    logger.debug("create_employee - Saved employee %s (id %s)", db_employee.employee_id, db_employee.id)
     return db_employee
 
+def bulk_create_employees(db: Session, employees: List[schemas.EmployeeCreate]) -> Set[str]:
+    """
+    Inserts a batch in one statement; returns the employee_ids that were inserted (others conflicted).
+    The rows are embedded for semantic search by the background index sync, not by the import.
+    """
+    return bulk_insert(db, models.Employee, "employee_id", [employee.model_dump() for employee in employees])
+
 def delete_employee(db: Session, employee_id: str):
     db_employee = db.query(models.Employee).filter(models.Employee.employee_id == employee_id).first()
     if db_employee:
+        row_id = db_employee.id
         db.delete(db_employee)
+        bump_version(db, models.Employee.__tablename__)
         db.commit()
+        semantic.unindex_rows(models.Employee, [row_id])
         return True
     return False
@@ -0,0 +1,226 @@
+import re
+from sqlalchemy import Date, DateTime, Float, Integer, Numeric, and_, literal_column, or_, select, table
+from typing import Any, Dict, Iterable, List, Optional
+from .. import text_search
+
+EXACT = "exact"
+PREFIX = "prefix"
+SUBSTRING = "substring"
+
+# How LLM-extracted filter values are matched, per table and column (default: substring).
+# Exact and prefix matches can use the B-tree indexes; substring matches use the text search index.
+MATCH_MODES: Dict[str, Dict[str, str]] = {
+    "employees": {
+        "employee_id": PREFIX,
+        "gender": EXACT,
+    },
+    "orders": {
+        "order_id": PREFIX,
+    },
+}
+# The trigram tokenizer only indexes values of at least 3 characters
+FTS_MIN_LENGTH = 3
+# Upper bound for prefix ranges: `value <= column < value + PREFIX_END`
+PREFIX_END = "\U0010ffff"
+
+# Operators accepted in {"column": {"op": value}} filters, with the spellings the LLM tends to use
+OPERATOR_ALIASES = {
+    "eq": "eq", "=": "eq", "==": "eq",
+    "ne": "ne", "!=": "ne",
+    "gt": "gt", ">": "gt",
+    "gte": "gte", ">=": "gte", "from": "gte", "min": "gte", "start": "gte",
+    "lt": "lt", "<": "lt",
+    "lte": "lte", "<=": "lte", "to": "lte", "max": "lte", "end": "lte",
+    "in": "in",
+    "between": "between",
+    "prefix": "prefix", "startswith": "prefix",
+    "contains": "contains", "like": "contains",
+}
+_COMPARISON_RE = re.compile(r"^\s*(>=|<=|>|<|=|!=)\s*(.+?)\s*$")
+_NUMBER_RANGE_RE = re.compile(r"^\s*(-?[\d,.]+)\s*(?:-|~|～|到|至)\s*(-?[\d,.]+)\s*$")
+_DATE_RANGE_RE = re.compile(r"^\s*(\d{4}[-/.]\d{1,2}(?:[-/.]\d{1,2})?)\s*(?:~|～|到|至|\s+to\s+)\s*(\d{4}[-/.]\d{1,2}(?:[-/.]\d{1,2})?)\s*$")
+_DATE_RE = re.compile(r"^(\d{4})(?:[-/.](\d{1,2}))?(?:[-/.](\d{1,2}))?$")
+
+
+def column_kind(model, column_name: str) -> str:
+    """'number', 'date' or 'text'. String columns holding ISO dates declare info={"filter_type": "date"}."""
+    column = model.__table__.c[column_name]
+    if column.info.get("filter_type"):
+        return column.info["filter_type"]
+    if isinstance(column.type, (Integer, Numeric, Float)):
+        return "number"
+    if isinstance(column.type, (Date, DateTime)):
+        return "date"
+    return "text"
+
+
+def _to_number(value: Any):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = str(value).replace(",", "").strip()
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            raise ValueError(f"'{value}' is not a number")
+
+
+def _to_date(value: Any) -> str:
+    """Normalizes '2024/3/1', '2024-03' or '2024' to zero-padded ISO form (possibly partial)."""
+    match = _DATE_RE.match(str(value).strip())
+    if not match:
+        raise ValueError(f"'{value}' is not a date (expected YYYY, YYYY-MM or YYYY-MM-DD)")
+    year, month, day = match.groups()
+    parts = [year] + [f"{int(p):02d}" for p in (month, day) if p]
+    return "-".join(parts)
+
+
+def _is_partial_date(value: str) -> bool:
+    return len(value) < len("YYYY-MM-DD")
+
+
+def _fts_predicate(model, column_name: str, value: str):
+    fts = text_search.fts_table_name(model.__tablename__)
+    phrase = '"' + value.replace('"', '""') + '"'
+    matching_ids = (
+        select(literal_column("rowid"))
+        .select_from(table(fts))
+        .where(literal_column(fts).op("MATCH")(f"{column_name} : {phrase}"))
+    )
+    return model.id.in_(matching_ids)
+
+
+def match_predicate(model, column_name: str, value: Any, mode: Optional[str] = None):
+    """Builds the WHERE clause for one text value using the column's match mode."""
+    column = getattr(model, column_name)
+    mode = mode or MATCH_MODES.get(model.__tablename__, {}).get(column_name, SUBSTRING)
+    value = str(value)
+
+    if mode == EXACT:
+        return column == value
+    if mode == PREFIX:
+        # A range instead of LIKE 'value%', so any B-tree index on the column applies
+        return and_(column >= value, column < value + PREFIX_END)
+
+    indexed = column_name in text_search.SEARCH_COLUMNS.get(model.__tablename__, ())
+    if indexed and text_search.backend == "fts5" and len(value) >= FTS_MIN_LENGTH:
+        return _fts_predicate(model, column_name, value)
+    # Use 'like' for partial string matching (served by the trigram GIN index on Postgres)
+    return column.like(f"%{value}%")
+
+
+def _operator_predicate(model, column_name: str, kind: str, op: str, value: Any):
+    column = getattr(model, column_name)
+
+    if op == "in":
+        values = value if isinstance(value, (list, tuple)) else [value]
+        if kind == "number":
+            return column.in_([_to_number(v) for v in values])
+        if kind == "text":
+            return column.in_([str(v) for v in values])
+        # Dates: a partial date is a period, so each value is its own range
+        return or_(*(_operator_predicate(model, column_name, kind, "eq", v) for v in values))
+    if op == "between":
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            raise ValueError(f"'between' on '{column_name}' needs [low, high]")
+        return and_(
+            _operator_predicate(model, column_name, kind, "gte", value[0]),
+            _operator_predicate(model, column_name, kind, "lte", value[1]),
+        )
+    if op in ("prefix", "contains"):
+        return match_predicate(model, column_name, value, PREFIX if op == "prefix" else SUBSTRING)
+
+    if kind == "number":
+        value = _to_number(value)
+    elif kind == "date":
+        value = _to_date(value)
+        if _is_partial_date(value):
+            # A partial date is the whole period: "2024-03" covers 2024-03-01 .. 2024-03-31
+            period_start, period_end = value, value + PREFIX_END
+            return {
+                "eq": and_(column >= period_start, column < period_end),
+                "ne": or_(column < period_start, column >= period_end),
+                "gt": column >= period_end,
+                "gte": column >= period_start,
+                "lt": column < period_start,
+                "lte": column < period_end,
+            }[op]
+    else:
+        # Explicit operators on text compare the whole value; fuzzy matching is for bare values
+        value = str(value)
+
+    return {
+        "eq": column == value,
+        "ne": column != value,
+        "gt": column > value,
+        "gte": column >= value,
+        "lt": column < value,
+        "lte": column <= value,
+    }[op]
+
+
+def _scalar_predicate(model, column_name: str, kind: str, value: Any):
+    """Parses a plain value, including range strings such as '>=1000', '30-40' or '2024-01~2024-03'."""
+    if isinstance(value, str) and kind in ("number", "date"):
+        comparison = _COMPARISON_RE.match(value)
+        if comparison:
+            op = OPERATOR_ALIASES[comparison.group(1)]
+            return _operator_predicate(model, column_name, kind, op, comparison.group(2))
+        range_re = _NUMBER_RANGE_RE if kind == "number" else _DATE_RANGE_RE
+        value_range = range_re.match(value)
+        if value_range:
+            return _operator_predicate(model, column_name, kind, "between", list(value_range.groups()))
+    if kind == "text":
+        return match_predicate(model, column_name, value)
+    return _operator_predicate(model, column_name, kind, "eq", value)
+
+
+def compile_filter(model, column_name: str, value: Any):
+    """
+    Turns one LLM-extracted filter into a typed predicate based on the column's SQL type:
+    - scalar: equality for numbers/dates (a partial date is its whole period), match mode for text
+    - list: any of the values (IN for numbers, any of the scalar matches for text and dates)
+    - dict: operators, e.g. {"gte": 30, "lte": 40}, {"between": ["2024-01", "2024-03"]};
+      `eq`/`in` on text are exact (= / IN), only `prefix`/`contains` match part of the value
+    - range strings: ">=1000", "30-40", "2024-01-01~2024-01-31"
+    """
+    kind = column_kind(model, column_name)
+    if isinstance(value, dict):
+        predicates = []
+        for op, operand in value.items():
+            normalized = OPERATOR_ALIASES.get(str(op).lower())
+            if normalized is None:
+                raise ValueError(f"Unsupported operator '{op}' on '{column_name}', expected one of {sorted(set(OPERATOR_ALIASES.values()))}")
+            predicates.append(_operator_predicate(model, column_name, kind, normalized, operand))
+        return and_(*predicates)
+    if isinstance(value, (list, tuple)):
+        if kind == "number":
+            return _operator_predicate(model, column_name, kind, "in", value)
+        return or_(*(_scalar_predicate(model, column_name, kind, v) for v in value))
+    return _scalar_predicate(model, column_name, kind, value)
+
+
+def compile_filters(model, filters: Dict[str, Any] = None) -> List[Any]:
+    predicates = []
+    for column_name, value in (filters or {}).items():
+        if column_name in model.__table__.c and value is not None and value != "":
+            predicates.append(compile_filter(model, column_name, value))
+    return predicates
+
+
+def apply_filters(query, model, filters: Dict[str, Any] = None):
+    for predicate in compile_filters(model, filters):
+        query = query.filter(predicate)
+    return query
+
+
+def check_filterable(filters: Dict[str, Any], filterable_columns: Iterable[str], extra_parameters: Iterable[str] = ()) -> None:
+    """Rejects filters on columns that the SystemInfo catalog does not list as filterable."""
+    allowed = set(filterable_columns)
+    if not allowed:
+        return
+    rejected = [c for c in (filters or {}) if c not in allowed and c not in extra_parameters]
+    if rejected:
+        raise ValueError(f"欄位 {rejected} 不可篩選，可篩選欄位為 {sorted(allowed)}")
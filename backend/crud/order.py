@@ -1,31 +1,76 @@
 from sqlalchemy.orm import Session
-from typing import Dict, Any
+from typing import Dict, Any, List, Set
+from sqlalchemy import func
 from .. import models, schemas
+from .aggregate import aggregate, AGGREGATE_TOOLS
+from .filters import apply_filters
+from .pagination import Page, keyset_page, iter_keyset
+from .bulk import bulk_insert
+from .tools import register_tool
+from .versions import bump_version
+from . import semantic
 
 # Order CRUD operations
 def get_order(db: Session, order_id: str):
     return db.query(models.Order).filter(models.Order.order_id == order_id).first()
 
+@register_tool(models.Order, schemas.Order, projection=True)
 def get_orders(db: Session, filters: Dict[str, Any] = None, skip: int = 0, limit: int = 100):
-    query = db.query(models.Order)
-    if filters:
-        for column, value in filters.items():
-            if hasattr(models.Order, column):
-                # Use 'like' for partial string matching
-                query = query.filter(getattr(models.Order, column).like(f"%{value}%"))
+    query = apply_filters(db.query(models.Order), models.Order, filters)
     return query.offset(skip).limit(limit).all()
 
+# Indexed columns the list endpoint can page by
+ORDER_SORT_KEYS = ("id", "order_id", "order_date")
+
+def get_orders_page(db: Session, filters: Dict[str, Any] = None, cursor: str = None,
+                    sort: str = "id", limit: int = 100) -> Page:
+    query = apply_filters(db.query(models.Order), models.Order, filters)
+    return keyset_page(query, models.Order, ORDER_SORT_KEYS, sort=sort, cursor=cursor, limit=limit)
+
+def iter_orders(db: Session, filters: Dict[str, Any] = None, batch_size: int = 1000):
+    query = apply_filters(db.query(models.Order), models.Order, filters)
+    return iter_keyset(query, models.Order, batch_size=batch_size)
+
+ORDER_VALUE_COLUMNS = {"order_amount": models.Order.order_amount}
+ORDER_GROUP_COLUMNS = {
+    "order_date": models.Order.order_date,
+    # order_date is stored as 'YYYY-MM-DD', so its first 7 characters are the month
+    "order_month": func.substr(models.Order.order_date, 1, 7),
+}
+AGGREGATE_TOOLS["aggregate_orders"] = {
+    "columns": list(ORDER_VALUE_COLUMNS),
+    "group_by": list(ORDER_GROUP_COLUMNS),
+}
+
+@register_tool(models.Order)
+def aggregate_orders(db: Session, filters: Dict[str, Any] = None, metric: str = "count",
+                     column: str = None, group_by: str = None):
+    return aggregate(db, models.Order, ORDER_VALUE_COLUMNS, ORDER_GROUP_COLUMNS,
+                     filters=filters, metric=metric, column=column, group_by=group_by)
+
 def create_order(db: Session, order: schemas.OrderCreate):
     db_order = models.Order(order_id=order.order_id, order_date=order.order_date, order_amount=order.order_amount)
     db.add(db_order)
+    bump_version(db, models.Order.__tablename__)
     db.commit()
     db.refresh(db_order)
+    semantic.index_rows(models.Order, [db_order])
     return db_order
 
+def bulk_create_orders(db: Session, orders: List[schemas.OrderCreate]) -> Set[str]:
+    """
+    Inserts a batch in one statement; returns the order_ids that were inserted (others conflicted).
+    The rows are embedded for semantic search by the background index sync, not by the import.
+    """
+    return bulk_insert(db, models.Order, "order_id", [order.model_dump() for order in orders])
+
 def delete_order(db: Session, order_id: str):
     db_order = db.query(models.Order).filter(models.Order.order_id == order_id).first()
     if db_order:
+        row_id = db_order.id
         db.delete(db_order)
+        bump_version(db, models.Order.__tablename__)
         db.commit()
+        semantic.unindex_rows(models.Order, [row_id])
         return True
     return False
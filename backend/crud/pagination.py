@@ -0,0 +1,85 @@
+import json
+import base64
+from typing import Any, Iterator, List, NamedTuple, Optional, Sequence
+from sqlalchemy import and_, or_
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def encode_cursor(sort: str, row, direction: str) -> str:
+    payload = {"s": sort, "v": getattr(row, sort), "id": row.id, "d": direction}
+    return base64.urlsafe_b64encode(json.dumps(payload, ensure_ascii=False).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict) or {"s", "v", "id", "d"} - payload.keys() or payload["d"] not in ("next", "prev"):
+            raise ValueError
+        return payload
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_page(query, model, sort_keys: Sequence[str], sort: str = "id",
+                cursor: Optional[str] = None, limit: int = 100) -> Page:
+    """
+    Returns one page ordered by (`sort`, id), starting after/before the row encoded in `cursor`.
+    Every page is an index range scan from the cursor, so page N costs the same as page 1,
+    and rows inserted or deleted elsewhere do not shift the pages.
+    """
+    if sort not in sort_keys:
+        raise ValueError(f"Cannot sort by '{sort}', expected one of {list(sort_keys)}")
+
+    direction = "next"
+    if cursor:
+        position = decode_cursor(cursor)
+        if position["s"] != sort:
+            raise ValueError("Cursor was created for a different sort key")
+        direction = position["d"]
+        key, last_value, last_id = getattr(model, sort), position["v"], position["id"]
+        if sort == "id":
+            query = query.filter(model.id > last_id if direction == "next" else model.id < last_id)
+        elif direction == "next":
+            query = query.filter(or_(key > last_value, and_(key == last_value, model.id > last_id)))
+        else:
+            query = query.filter(or_(key < last_value, and_(key == last_value, model.id < last_id)))
+
+    order = [getattr(model, sort), model.id] if sort != "id" else [model.id]
+    if direction == "prev":
+        order = [column.desc() for column in order]
+    # One extra row tells whether there is a page beyond this one
+    rows = query.order_by(*order).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev":
+        rows.reverse()
+
+    if not rows:
+        return Page(rows, None, None)
+    more_after = has_more if direction == "next" else True
+    more_before = bool(cursor) if direction == "next" else has_more
+    return Page(
+        rows,
+        encode_cursor(sort, rows[-1], "next") if more_after else None,
+        encode_cursor(sort, rows[0], "prev") if more_before else None,
+    )
+
+
+def iter_keyset(query, model, batch_size: int = 1000) -> Iterator[Any]:
+    """Streams every row of `query` in id order, one keyset page at a time, in constant memory per batch."""
+    last_id = None
+    while True:
+        batch_query = query if last_id is None else query.filter(model.id > last_id)
+        rows = batch_query.order_by(model.id).limit(batch_size).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+        if len(rows) < batch_size:
+            return
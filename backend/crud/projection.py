@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+from .filters import compile_filters
+
+
+class Rows(NamedTuple):
+    columns: List[str]
+    rows: List[Tuple[Any, ...]]
+
+
+def select_rows(db: Session, model, columns: Sequence[str], filters: Dict[str, Any] = None,
+                skip: int = 0, limit: int = 100) -> Rows:
+    """
+    Same rows as the get_* list functions, but selects only `columns` and returns plain tuples:
+    no ORM identity map, no per-row objects to validate and dump.
+    """
+    stmt = select(*(getattr(model, column) for column in columns))
+    predicates = compile_filters(model, filters)
+    if predicates:
+        stmt = stmt.where(*predicates)
+    rows = db.execute(stmt.offset(skip).limit(limit)).all()
+    return Rows(list(columns), [tuple(row) for row in rows])
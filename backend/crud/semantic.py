@@ -0,0 +1,146 @@
+import logging
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional
+from .. import models, schemas
+from ..vector_index import get_index
+from .filters import apply_filters
+from .tools import register_tool
+
+logger = logging.getLogger(__name__)
+
+# Columns whose values make up the embedded text of a row, per model
+EMBEDDED_COLUMNS = {
+    models.Employee: ("name", "address", "email", "phone", "gender", "age"),
+    models.Order: ("order_id", "order_date", "order_amount"),
+}
+# Response columns, in the same order as the list tools
+RESULT_SCHEMAS = {
+    models.Employee: schemas.Employee,
+    models.Order: schemas.Order,
+}
+# Semantic search tool functions. Used by the system prompt and the function declarations.
+SEARCH_TOOLS: Dict[str, Dict[str, Any]] = {}
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 50
+# Candidates fetched from the index per requested row, so column filters still leave `top_k` rows
+FILTER_OVERFETCH = 5
+SYNC_BATCH = 5000
+
+
+def row_text(model, row) -> str:
+    return " ".join(str(getattr(row, column)) for column in EMBEDDED_COLUMNS[model] if getattr(row, column) is not None)
+
+
+def index_rows(model, rows: Iterable[Any]) -> None:
+    """Adds created rows to the model's vector index. Index failures never fail the write."""
+    index = get_index(model.__tablename__)
+    if index is None:
+        return
+    try:
+        index.add((row.id, row_text(model, row)) for row in rows)
+    except Exception:
+        # The next sync_index picks the rows up again (their ids are above the watermark)
+        logger.warning("Could not index new %s rows", model.__tablename__, exc_info=True)
+
+
+def unindex_rows(model, row_ids: Iterable[int]) -> None:
+    index = get_index(model.__tablename__)
+    if index is None:
+        return
+    try:
+        index.remove(row_ids)
+    except Exception:
+        logger.warning("Could not remove %s rows from the vector index", model.__tablename__, exc_info=True)
+
+
+def check_row_ids(db: Session, model) -> bool:
+    """
+    False (with a warning) for a SQLite table created before it had AUTOINCREMENT: it reuses
+    the id of a deleted last row, which `sync_index` would take as already indexed.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return True
+    sql = db.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": model.__tablename__}
+    ).scalar()
+    if sql and "AUTOINCREMENT" not in sql.upper():
+        logger.warning(
+            "Table %s has no AUTOINCREMENT and may reuse deleted row ids; semantic search can miss "
+            "rows added by other workers until it is recreated.", model.__tablename__
+        )
+        return False
+    return True
+
+
+def sync_index(db: Session, model) -> int:
+    """
+    Embeds the rows added since the index was last written (ids above its watermark), e.g. by
+    a bulk import, another process or while the server was down. Returns the number of rows added.
+    Run by the app's background sync task only, never on the request path.
+    """
+    index = get_index(model.__tablename__)
+    if index is None:
+        return 0
+    columns = [model.id] + [getattr(model, column) for column in EMBEDDED_COLUMNS[model]]
+    added = 0
+    while True:
+        rows = db.execute(
+            select(*columns).where(model.id > index.watermark).order_by(model.id).limit(SYNC_BATCH)
+        ).all()
+        if not rows:
+            return added
+        added += index.add((row.id, row_text(model, row)) for row in rows)
+
+
+def semantic_search(db: Session, model, query: str, filters: Optional[Dict[str, Any]] = None,
+                    top_k: int = DEFAULT_TOP_K) -> List[Dict[str, Any]]:
+    """
+    The `top_k` rows most similar to the free-text `query`, best first, each with its `score`
+    (cosine similarity of hashed character n-grams). Column `filters` narrow the candidates.
+    Rows written elsewhere are found once the background sync has embedded them (see sync_index).
+    """
+    index = get_index(model.__tablename__)
+    if index is None:
+        raise ValueError("語意搜尋未啟用 (需要 numpy，且 VECTOR_INDEX_ENABLED 不可為 false)")
+    if not query or not str(query).strip():
+        raise ValueError("語意搜尋需要 `query` 參數")
+    top_k = max(1, min(int(top_k or DEFAULT_TOP_K), MAX_TOP_K))
+
+    hits = index.search(str(query), top_k * FILTER_OVERFETCH if filters else top_k)
+    if not hits:
+        return []
+
+    scores = dict(hits)
+    rows = apply_filters(db.query(model).filter(model.id.in_(scores)), model, filters).all()
+    found = {row.id: row for row in rows}
+    if not filters:
+        # Rows deleted behind the index's back (another process, raw SQL) are dropped from it
+        missing = [row_id for row_id in scores if row_id not in found]
+        if missing:
+            unindex_rows(model, missing)
+
+    fields = list(RESULT_SCHEMAS[model].model_fields)
+    results = []
+    for row_id, score in hits:
+        row = found.get(row_id)
+        if row is None:
+            continue
+        results.append({**{field: getattr(row, field) for field in fields}, "score": round(score, 3)})
+        if len(results) == top_k:
+            break
+    return results
+
+
+SEARCH_TOOLS["search_employees"] = {"columns": list(EMBEDDED_COLUMNS[models.Employee])}
+
+@register_tool(models.Employee, schemas.Employee, threaded=True)
+def search_employees(db: Session, query: str = "", filters: Dict[str, Any] = None, top_k: int = DEFAULT_TOP_K):
+    return semantic_search(db, models.Employee, query, filters=filters, top_k=top_k)
+
+
+SEARCH_TOOLS["search_orders"] = {"columns": list(EMBEDDED_COLUMNS[models.Order])}
+
+@register_tool(models.Order, schemas.Order, threaded=True)
+def search_orders(db: Session, query: str = "", filters: Dict[str, Any] = None, top_k: int = DEFAULT_TOP_K):
+    return semantic_search(db, models.Order, query, filters=filters, top_k=top_k)
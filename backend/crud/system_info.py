@@ -1,10 +1,13 @@
 from sqlalchemy.orm import Session
 from .. import models, schemas
+from .tools import register_tool
+from .versions import bump_version
 
 # SystemInfo CRUD operations
 def get_system_info(db: Session, system_name: str):
     return db.query(models.SystemInfo).filter(models.SystemInfo.system_name == system_name).first()
 
+@register_tool(models.SystemInfo, schemas.SystemInfo, projection=True)
 def get_all_system_info(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.SystemInfo).offset(skip).limit(limit).all()
 
@@ -16,6 +19,7 @@ def create_system_info(db: Session, system_info: schemas.SystemInfoCreate):
         frontend_route_name=system_info.frontend_route_name
     )
     db.add(db_system_info)
+    bump_version(db, models.SystemInfo.__tablename__)
     db.commit()
     db.refresh(db_system_info)
     return db_system_info
@@ -24,6 +28,7 @@ def delete_system_info(db: Session, system_name: str):
     db_system_info = db.query(models.SystemInfo).filter(models.SystemInfo.system_name == system_name).first()
     if db_system_info:
         db.delete(db_system_info)
+        bump_version(db, models.SystemInfo.__tablename__)
         db.commit()
         return True
     return False
@@ -0,0 +1,65 @@
+import os
+import inspect
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+from .filters import column_kind
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """
+    Everything the QnA dispatcher needs to know about one query function, computed once
+    when the function is registered instead of on every tool call.
+    """
+    name: str
+    func: Callable[..., Any]
+    model: Any
+    # Pydantic schema of the returned rows; None for functions returning their own dicts
+    schema: Any
+    # Keyword arguments the function accepts besides `db` and `filters` (e.g. metric, query)
+    parameters: Tuple[str, ...]
+    # The subset of `parameters` an LLM tool call may set (see LLM_ARGUMENTS)
+    llm_parameters: Tuple[str, ...]
+    accepts_filters: bool
+    # Columns selected as plain tuples (crud.select_rows) instead of calling `func`; None to call it
+    projection: Optional[Tuple[str, ...]]
+    # Column -> 'number', 'date' or 'text' (see filters.column_kind)
+    filter_kinds: Dict[str, str]
+    # CPU-bound (e.g. a vector search): run on a thread-backed session, never inside the
+    # event loop's run_sync
+    threaded: bool = False
+
+
+# Keyword arguments an LLM tool call may set; pagination (skip/limit) stays with the server
+LLM_ARGUMENTS = ("metric", "column", "group_by", "query", "top_k")
+# `limit` passed to the list functions by a tool call, whatever the LLM asked for
+TOOL_ROW_LIMIT = int(os.getenv("QNA_TOOL_ROW_LIMIT", "100"))
+
+# Query functions the LLM may call, by name. Populated by @register_tool.
+TOOLS: Dict[str, ToolSpec] = {}
+
+
+def register_tool(model, schema=None, projection: bool = False, threaded: bool = False):
+    """
+    Declares a crud function as a QnA tool over `model`. With `projection`, tool calls select
+    just the fields of `schema` as row tuples, the same rows the function would return.
+    `threaded` marks functions doing CPU work besides their queries (see ToolSpec.threaded).
+    A new ERP module only needs this decorator on its query functions and a SystemInfo row.
+    """
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(func).parameters
+        parameters = tuple(name for name in signature if name not in ("db", "filters"))
+        TOOLS[func.__name__] = ToolSpec(
+            name=func.__name__,
+            func=func,
+            model=model,
+            schema=schema,
+            parameters=parameters,
+            llm_parameters=tuple(name for name in parameters if name in LLM_ARGUMENTS),
+            accepts_filters="filters" in signature,
+            projection=tuple(schema.model_fields) if projection else None,
+            filter_kinds={column.name: column_kind(model, column.name) for column in model.__table__.columns},
+            threaded=threaded,
+        )
+        return func
+    return decorator
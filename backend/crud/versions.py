@@ -0,0 +1,28 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from .. import models
+
+
+def get_version(db: Session, name: str) -> int:
+    """Current change counter of `name` (a table name); 0 before its first write."""
+    version = db.execute(select(models.DataVersion.version).where(models.DataVersion.name == name)).scalar()
+    return version or 0
+
+
+def bump_version(db: Session, name: str) -> None:
+    """
+    Increments the counter of `name` in the caller's transaction, so it commits together
+    with the write it describes. Other workers notice the change by polling the counter.
+    """
+    stmt = (
+        update(models.DataVersion)
+        .where(models.DataVersion.name == name)
+        .values(version=models.DataVersion.version + 1)
+    )
+    if db.execute(stmt).rowcount:
+        return
+    # First write of this table; another worker may create the row at the same time
+    from .bulk import _insert_ignoring_conflicts  # bulk bumps versions itself
+    create = _insert_ignoring_conflicts(db, models.DataVersion)
+    db.execute(create if create is not None else insert(models.DataVersion), {"name": name, "version": 0})
+    db.execute(stmt)
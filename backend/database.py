@@ -1,8 +1,19 @@
 import os
-from sqlalchemy import create_engine
+import time
+import logging
+import threading
+from contextlib import asynccontextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
 
 # Get the base directory of the project (one level up from 'backend')
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -15,15 +26,192 @@ if not DATABASE_URL:
     # 建議直接寫死路徑在 /app 下，或者當前目錄
     DATABASE_URL = "sqlite:///./sql_app.db"
 
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_POSTGRES = DATABASE_URL.startswith(("postgresql", "postgres"))
+
+# Connection pool (QueuePool is used for file-based SQLite and for Postgres)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds after which a connection is replaced (keeps clear of server/proxy idle timeouts)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Postgres only: queries running longer than this are cancelled by the server (0 = no limit)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+# Async engine (aiosqlite / asyncpg) for the async request handlers; falls back to the
+# threadpool when disabled or when the driver is not installed
+DB_ASYNC = os.getenv("DB_ASYNC", "true").lower() not in ("0", "false", "no")
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+# SQLite pragmas, applied to every new connection
+SQLITE_PRAGMAS = {
+    # Readers no longer block on a writer (and the writer not on readers)
+    "journal_mode": "WAL",
+    # Safe with WAL: only the last transactions can be lost on power failure, never corruption
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative values are KiB: 64 MiB page cache per connection
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536")),
+    # Wait for a lock instead of failing immediately with "database is locked"
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+
+
+class PoolMetrics:
+    """Checkout wait times and timeouts of the connection pool. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class _TimedCheckout:
+    """Pool mixin that records how long each checkout waited for a free (or new) connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+# SQLAlchemy names pool loggers after the pool class, which puts these under the app's
+# logger (and LOG_LEVEL); keep them at SQLAlchemy's usual WARNING
+for _pool_class in (TimedQueuePool, TimedAsyncQueuePool):
+    logging.getLogger(f"{_pool_class.__module__}.{_pool_class.__name__}").setLevel(logging.WARNING)
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return ":memory:" in url or url.split("?")[0] in ("sqlite://", "sqlite:///")
+
+
+def _engine_options(is_async: bool = False) -> Dict[str, Any]:
+    pool_class = TimedAsyncQueuePool if is_async else TimedQueuePool
+    if IS_SQLITE:
+        options: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+        # In-memory databases keep SQLAlchemy's single-connection pool
+        if not _is_memory_sqlite(DATABASE_URL):
+            options.update(poolclass=pool_class, pool_size=DB_POOL_SIZE,
+                           max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        return options
+
+    options = {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        # Drops connections the server closed (restart, failover) before handing them out
+        "pool_pre_ping": True,
+    }
+    if IS_POSTGRES and DB_STATEMENT_TIMEOUT_MS:
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _async_url(url: str) -> Optional[str]:
+    scheme, _, rest = url.partition("://")
+    if "+" in scheme:
+        # An explicit driver (e.g. postgresql+psycopg2) is sync; swap in the async one
+        scheme = scheme.split("+")[0]
+    driver = ASYNC_DRIVERS.get(scheme)
+    return f"{driver}://{rest}" if driver else None
+
+
 # 建立 engine
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+engine = create_engine(DATABASE_URL, **_engine_options())
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+
+async_engine = None
+if DB_ASYNC and _async_url(DATABASE_URL):
+    try:
+        async_engine = create_async_engine(_async_url(DATABASE_URL), **_engine_options(is_async=True))
+    except ImportError as e:
+        logger.warning("Async database driver not available (%s); DB work runs in the threadpool instead.", e)
+if async_engine is not None and IS_SQLITE:
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: objects returned by async crud calls stay readable after their commit
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if async_engine is not None else None
+)
 
 Base = declarative_base()
 
+
+def _pool_usage(pool) -> Dict[str, Any]:
+    usage: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        usage.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    return usage
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Current pool usage (sync and async engine) plus the checkout wait metrics."""
+    stats: Dict[str, Any] = {"dialect": engine.dialect.name, **_pool_usage(engine.pool)}
+    stats["async_pool"] = _pool_usage(async_engine.pool) if async_engine is not None else None
+    stats.update(pool_metrics.stats())
+    return stats
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -31,3 +219,49 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class ThreadedSession:
+    """
+    Stand-in for AsyncSession when no async driver is available: `run_sync` runs the sync
+    crud function in the threadpool, so callers still never block the event loop.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def run_sync(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+async def dispose_engines() -> None:
+    """Closes pooled connections; aiosqlite keeps a non-daemon thread per open connection."""
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
+
+@asynccontextmanager
+async def async_session(threaded: bool = False) -> AsyncIterator[Any]:
+    """
+    An AsyncSession on the async engine, or a ThreadedSession when there is none. `threaded`
+    forces a ThreadedSession, for work that must not run on the event loop inside `run_sync`.
+    """
+    if AsyncSessionLocal is not None and not threaded:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = ThreadedSession(SessionLocal())
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+# Async dependency, used with the `crud.aio` functions
+async def get_async_db() -> AsyncIterator[Any]:
+    async with async_session() as db:
+        yield db
@@ -0,0 +1,118 @@
+import os
+import threading
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from .catalog import CatalogSnapshot, SystemEntry
+from .response_cache import normalize_prompt
+
+# Verbs that signal the user wants to open a page
+OPEN_VERBS = ("打開", "開啟", "打开", "开启", "進入", "进入", "前往", "切換到", "切换到", "跳到", "open", "go to", "goto", "show")
+# Words that signal a data question; these always go to the LLM
+QUERY_KEYWORDS = (
+    "查", "找", "搜尋", "多少", "幾", "几", "哪些", "哪個", "哪个", "列出",
+    "總", "总", "平均", "統計", "统计", "最", "?", "？", "嗎", "吗",
+)
+# Filler around the application name that does not help matching
+FILLER_WORDS = ("請", "请", "幫我", "帮我", "幫忙", "我要", "我想", "一下", "的", "頁面", "页面", "畫面", "画面", "程式", "程序", "應用", "应用", "page", "the", "app")
+# Generic suffixes of system names ("員工管理" -> "員工")
+NAME_SUFFIXES = ("管理系統", "管理系统", "管理", "系統", "系统")
+
+
+def _similarity(text: str, candidate: str) -> float:
+    if not text or not candidate:
+        return 0.0
+    if text == candidate:
+        return 1.0
+    return SequenceMatcher(None, text, candidate).ratio()
+
+
+class IntentRouter:
+    """
+    Resolves unambiguous "open application" questions locally, without an LLM call.
+    Anything that looks like a data question, or does not match a single application
+    with confidence >= `threshold`, falls back to the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.85, margin: float = 0.1):
+        self.threshold = threshold
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"fast_path": 0, "llm": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _match_keys(snapshot: CatalogSnapshot) -> List[Tuple[SystemEntry, Tuple[str, ...]]]:
+        """Lowercased names each application can be referred to by, memoized per catalog version."""
+        keys = snapshot.derived.get("intent_router_keys")
+        if keys is None:
+            keys = []
+            for system in snapshot.systems:
+                if not system.frontend_route_name:
+                    continue
+                name = normalize_prompt(system.system_name)
+                names = {name, normalize_prompt(system.frontend_route_name)}
+                for suffix in NAME_SUFFIXES:
+                    if name.endswith(suffix) and len(name) > len(suffix):
+                        names.add(name[: -len(suffix)])
+                        break
+                keys.append((system, tuple(names)))
+            snapshot.derived["intent_router_keys"] = keys
+        return keys
+
+    def match(self, user_prompt: str, snapshot: CatalogSnapshot) -> Optional[Tuple[SystemEntry, float]]:
+        """Returns (system, confidence) for the best matching application, or None."""
+        text = normalize_prompt(user_prompt)
+        if any(keyword in text for keyword in QUERY_KEYWORDS):
+            return None
+        verb = next((v for v in OPEN_VERBS if v in text), None)
+        if verb is None:
+            return None
+
+        target = text.replace(verb, "")
+        for word in FILLER_WORDS:
+            target = target.replace(word, "")
+        target = target.strip(" ,，、")
+
+        scored = sorted(
+            ((max(_similarity(target, name) for name in names), system) for system, names in self._match_keys(snapshot)),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        if not scored:
+            return None
+        best_score, best_system = scored[0]
+        # Two applications matching about equally well is ambiguous; let the LLM decide
+        if len(scored) > 1 and best_score - scored[1][0] < self.margin:
+            return None
+        return best_system, best_score
+
+    def route(self, user_prompt: str, snapshot: CatalogSnapshot) -> Optional[dict]:
+        """Returns an OPEN_APPLICATION response in the `get_question_scope` format, or None to use the LLM."""
+        matched = self.match(user_prompt, snapshot)
+        if matched is None or matched[1] < self.threshold:
+            self._count("llm")
+            return None
+
+        system, _ = matched
+        self._count("fast_path")
+        return {
+            "request_type": "OPEN_APPLICATION",
+            "llm_text_response": f"好的，正在為您打開{system.system_name}頁面。",
+            "tool_calls": [],
+            "frontend_route_name": system.frontend_route_name,
+        }
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats: Dict[str, object] = dict(self._counters)
+        total = stats["fast_path"] + stats["llm"]
+        stats["fast_path_ratio"] = stats["fast_path"] / total if total else 0.0
+        stats["threshold"] = self.threshold
+        return stats
+
+
+intent_router = IntentRouter(threshold=float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.85")))
@@ -0,0 +1,535 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import httpx
+
+from .metrics import registry
+
+try:
+    from google.api_core import exceptions as google_exceptions
+except ImportError:  # only needed to classify Gemini errors
+    google_exceptions = None
+
+logger = logging.getLogger(__name__)
+
+# Which backend ERPAssistant talks to: "gemini", "openai" (any OpenAI-compatible server) or "mock"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+LLM_MODEL = os.getenv("LLM_MODEL")
+# OpenAI-compatible endpoint, e.g. a local Ollama / vLLM / llama.cpp server
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:11434/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+# In-flight calls per provider; further calls wait (within their deadline) for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Deadline in seconds for one call, covering the wait for a slot, every attempt and the backoff
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+# Consecutive transient failures that open the circuit, and how long it stays open
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+# Reply of the mock provider (default: an UNKNOWN intent, which is also a valid plain answer)
+LLM_MOCK_REPLY = os.getenv(
+    "LLM_MOCK_REPLY",
+    '{"request_type": "UNKNOWN", "llm_text_response": "這是模擬的回答。", "tool_calls": []}',
+)
+# Function calls the mock provider makes when tools are declared, as a JSON list of
+# {"name": ..., "args": {...}}; calls to undeclared functions are left out
+LLM_MOCK_FUNCTION_CALLS = os.getenv("LLM_MOCK_FUNCTION_CALLS", "[]")
+
+# A prompt is a plain string, or a conversation for function calling, as a list of messages:
+#   {"role": "user", "text": ...}
+#   {"role": "model", "text": ..., "function_calls": [{"id": ..., "name": ..., "args": {...}}]}
+#   {"role": "function", "id": ..., "name": ..., "response": {...}}   (result of the call with that id)
+# Tools are declared provider-neutrally as {"name", "description", "parameters": JSON schema}.
+Prompt = Union[str, List[Dict[str, Any]]]
+
+LLM_RETRIES_TOTAL = registry.counter("qna_llm_retries_total", "Retried LLM attempts", ("provider",))
+LLM_TIMEOUTS_TOTAL = registry.counter("qna_llm_timeouts_total", "LLM calls that ran past their deadline", ("provider",))
+LLM_REJECTED_TOTAL = registry.counter("qna_llm_circuit_rejected_total", "LLM calls rejected by an open circuit", ("provider",))
+
+
+class LLMResult:
+    """
+    Text of one completion plus token usage (attribute names follow Gemini's usage metadata),
+    and the function calls the model made when tools were declared.
+    """
+
+    def __init__(self, text: str = "", prompt_token_count: int = 0, candidates_token_count: int = 0,
+                 function_calls: Optional[List[Dict[str, Any]]] = None):
+        self.text = text
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.function_calls = function_calls or []
+
+
+def prompt_text(prompt: Prompt) -> str:
+    """The prompt as one string, for character counts and payload logs."""
+    if isinstance(prompt, str):
+        return prompt
+    return json.dumps(prompt, ensure_ascii=False, default=str)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class LLMProvider:
+    """
+    A model backend: one prompt in, a completion (or a stream of text chunks) out.
+    With `tools`, the model may answer with function calls instead of text; `tool_mode`
+    "none" keeps the declarations (needed to read a conversation with calls) but forbids new calls.
+    """
+
+    name = "base"
+    model_name = ""
+
+    async def generate(self, prompt: Prompt, tools: Optional[List[dict]] = None, tool_mode: str = "auto") -> LLMResult:
+        raise NotImplementedError
+
+    async def stream(self, prompt: Prompt, result: LLMResult, tools: Optional[List[dict]] = None,
+                     tool_mode: str = "auto") -> AsyncIterator[str]:
+        """Yields text chunks; the full text and usage are left in `result` when the stream ends."""
+        completion = await self.generate(prompt, tools, tool_mode)
+        result.__dict__.update(vars(completion))
+        yield completion.text
+
+    def stats(self) -> dict:
+        return {}
+
+    async def aclose(self) -> None:
+        pass
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", api_key: Optional[str] = None, model=None):
+        if model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        # Anything with GenerativeModel's generate_content_async (e.g. the benchmark's fake model)
+        self.model = model
+        self.model_name = getattr(model, "model_name", model_name)
+
+    @staticmethod
+    def _messages(prompt: Prompt) -> list:
+        if isinstance(prompt, str):
+            return [{"role": "user", "parts": [prompt]}]
+        contents: List[dict] = []
+        for message in prompt:
+            if message["role"] == "function":
+                role = "user"
+                parts = [{"function_response": {"name": message["name"], "response": message["response"]}}]
+            else:
+                role = message["role"]
+                parts = [{"text": message["text"]}] if message.get("text") else []
+                parts += [{"function_call": {"name": call["name"], "args": call["args"]}}
+                          for call in message.get("function_calls", ())]
+            # Gemini wants consecutive parts of one role (e.g. several function responses) in one content
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].extend(parts)
+            else:
+                contents.append({"role": role, "parts": parts})
+        return contents
+
+    @staticmethod
+    def _tool_options(tools: Optional[List[dict]], tool_mode: str) -> dict:
+        if not tools:
+            return {}
+        return {
+            "tools": [{"function_declarations": tools}],
+            "tool_config": {"function_calling_config": {"mode": tool_mode.upper()}},
+        }
+
+    @staticmethod
+    def _result(response) -> LLMResult:
+        candidates = getattr(response, "candidates", None)
+        if not candidates:
+            return LLMResult(response.text)
+        # `response.text` raises when the reply contains function calls, so read the parts
+        texts, calls = [], []
+        for part in candidates[0].content.parts:
+            if "function_call" in part:
+                call = type(part.function_call).to_dict(part.function_call)
+                calls.append({"id": f"call_{len(calls)}", "name": call["name"], "args": _plain(call.get("args") or {})})
+            elif part.text:
+                texts.append(part.text)
+        return LLMResult("".join(texts), function_calls=calls)
+
+    @staticmethod
+    def _usage(response, result: LLMResult) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            result.prompt_token_count = getattr(usage, "prompt_token_count", 0) or 0
+            result.candidates_token_count = getattr(usage, "candidates_token_count", 0) or 0
+
+    async def generate(self, prompt: Prompt, tools: Optional[List[dict]] = None, tool_mode: str = "auto") -> LLMResult:
+        response = await self.model.generate_content_async(self._messages(prompt), **self._tool_options(tools, tool_mode))
+        result = self._result(response)
+        self._usage(response, result)
+        return result
+
+    async def stream(self, prompt: Prompt, result: LLMResult, tools: Optional[List[dict]] = None,
+                     tool_mode: str = "auto") -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(
+            self._messages(prompt), stream=True, **self._tool_options(tools, tool_mode)
+        )
+        chunks = []
+        async for chunk in response:
+            if not chunk.parts:
+                continue
+            chunks.append(chunk.text)
+            yield chunk.text
+        result.text = "".join(chunks)
+        self._usage(response, result)
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat Completions over a pooled httpx client (keep-alive connections are reused across calls)."""
+
+    name = "openai"
+
+    def __init__(self, base_url: str, model_name: str, api_key: str = "", timeout: float = LLM_TIMEOUT):
+        self.model_name = model_name
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 5.0)),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+        )
+
+    @staticmethod
+    def _messages(prompt: Prompt) -> list:
+        if isinstance(prompt, str):
+            return [{"role": "user", "content": prompt}]
+        messages = []
+        for message in prompt:
+            if message["role"] == "function":
+                messages.append({"role": "tool", "tool_call_id": message["id"],
+                                 "content": json.dumps(message["response"], ensure_ascii=False, default=str)})
+            elif message["role"] == "model":
+                entry: Dict[str, Any] = {"role": "assistant", "content": message.get("text") or None}
+                if message.get("function_calls"):
+                    entry["tool_calls"] = [
+                        {"id": call["id"], "type": "function",
+                         "function": {"name": call["name"], "arguments": json.dumps(call["args"], ensure_ascii=False)}}
+                        for call in message["function_calls"]
+                    ]
+                messages.append(entry)
+            else:
+                messages.append({"role": "user", "content": message["text"]})
+        return messages
+
+    def _body(self, prompt: Prompt, stream: bool, tools: Optional[List[dict]] = None, tool_mode: str = "auto") -> dict:
+        body = {"model": self.model_name, "messages": self._messages(prompt), "stream": stream}
+        if tools:
+            body["tools"] = [{"type": "function", "function": tool} for tool in tools]
+            body["tool_choice"] = tool_mode
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        return body
+
+    @staticmethod
+    def _usage(payload: dict, result: LLMResult) -> None:
+        usage = payload.get("usage") or {}
+        result.prompt_token_count = usage.get("prompt_tokens", 0)
+        result.candidates_token_count = usage.get("completion_tokens", 0)
+
+    async def generate(self, prompt: Prompt, tools: Optional[List[dict]] = None, tool_mode: str = "auto") -> LLMResult:
+        response = await self._client.post("/chat/completions", json=self._body(prompt, False, tools, tool_mode))
+        response.raise_for_status()
+        payload = response.json()
+        message = payload["choices"][0]["message"]
+        calls = [
+            {"id": call["id"], "name": call["function"]["name"], "args": json.loads(call["function"]["arguments"] or "{}")}
+            for call in message.get("tool_calls") or ()
+        ]
+        result = LLMResult(message.get("content") or "", function_calls=calls)
+        self._usage(payload, result)
+        return result
+
+    async def stream(self, prompt: Prompt, result: LLMResult, tools: Optional[List[dict]] = None,
+                     tool_mode: str = "auto") -> AsyncIterator[str]:
+        chunks = []
+        body = self._body(prompt, True, tools, tool_mode)
+        async with self._client.stream("POST", "/chat/completions", json=body) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                payload = json.loads(data)
+                if payload.get("usage"):
+                    self._usage(payload, result)
+                for choice in payload.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        chunks.append(text)
+                        yield text
+        result.text = "".join(chunks)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+class MockProvider(LLMProvider):
+    """
+    Canned reply after an optional delay, for tests and local runs without a model. When tools
+    are declared and calls are allowed, the scripted `function_calls` to declared functions are
+    returned instead, so the function-calling pipeline can run offline too.
+    """
+
+    name = "mock"
+    model_name = "mock"
+
+    def __init__(self, reply: str = LLM_MOCK_REPLY, latency: float = 0.0,
+                 function_calls: Optional[List[Dict[str, Any]]] = None):
+        self.reply = reply
+        self.latency = latency
+        self.function_calls = json.loads(LLM_MOCK_FUNCTION_CALLS) if function_calls is None else function_calls
+        self.calls = 0
+
+    async def generate(self, prompt: Prompt, tools: Optional[List[dict]] = None, tool_mode: str = "auto") -> LLMResult:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt_tokens = len(prompt_text(prompt)) // 2
+        if tools and tool_mode != "none":
+            declared = {tool["name"] for tool in tools}
+            calls = [
+                {"id": f"call_{i}", "name": call["name"], "args": call.get("args") or {}}
+                for i, call in enumerate(c for c in self.function_calls if c["name"] in declared)
+            ]
+            if calls:
+                return LLMResult("", prompt_tokens, 0, function_calls=calls)
+        return LLMResult(self.reply, prompt_tokens, len(self.reply) // 2)
+
+
+def _plain(value: Any) -> Any:
+    """Function call arguments as plain JSON values (protobuf Struct numbers are always floats)."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errors worth retrying: timeouts, connection failures, rate limits and 5xx responses."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in (408, 429) or status >= 500
+    if google_exceptions is not None:
+        return isinstance(error, (
+            google_exceptions.TooManyRequests,
+            google_exceptions.InternalServerError,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.DeadlineExceeded,
+        ))
+    return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive transient failures and rejects calls for `cooldown`
+    seconds; then one trial call is let through (half-open), and its outcome closes or reopens it.
+    """
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self) -> bool:
+        """Raises CircuitOpenError while open; returns True when the call is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_running):
+            raise CircuitOpenError("LLM circuit is open after repeated failures")
+        if state == "half_open":
+            self._trial_running = True
+            return True
+        return False
+
+    def end_trial(self) -> None:
+        """Called when the trial call ends: one that was cancelled lets the next call be the trial."""
+        self._trial_running = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+
+class ResilientProvider(LLMProvider):
+    """
+    Wraps a provider with a concurrency cap, a deadline per call, jittered exponential
+    retries on transient errors and a circuit breaker. Streams are only retried until
+    their first chunk has been yielded.
+    """
+
+    def __init__(self, provider: LLMProvider, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.name = provider.name
+        self.model_name = provider.model_name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.BoundedSemaphore(max_concurrency)
+        self.in_flight = 0
+
+    def _backoff(self, attempt: int, remaining: float) -> float:
+        # Full jitter: spreads the retries of concurrent callers instead of synchronizing them
+        return min(random.uniform(0, self.backoff_base * 2 ** attempt), max(remaining, 0))
+
+    def _failed(self, error: BaseException, attempt: int, deadline: float) -> Optional[float]:
+        """Records a failed attempt; returns the backoff before the next one, or None to give up."""
+        if isinstance(error, asyncio.TimeoutError):
+            LLM_TIMEOUTS_TOTAL.inc(provider=self.name)
+        if not is_transient(error):
+            # The request itself is bad (e.g. 400); the backend is fine
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        remaining = deadline - time.monotonic()
+        if attempt >= self.retries or remaining <= 0 or self.breaker.state != "closed":
+            return None
+        LLM_RETRIES_TOTAL.inc(provider=self.name)
+        logger.warning("LLM call to %s failed (%s), retrying (attempt %d)", self.name, error, attempt + 1)
+        return self._backoff(attempt, remaining)
+
+    async def _acquire(self, deadline: float) -> bool:
+        """Takes a concurrency slot, then passes the breaker; returns True for the half-open trial."""
+        # The slot comes first: a call that times out waiting for one never holds the trial
+        async with asyncio.timeout(max(deadline - time.monotonic(), 0)):
+            await self._semaphore.acquire()
+        try:
+            trial = self.breaker.before_call()
+        except CircuitOpenError:
+            self._semaphore.release()
+            LLM_REJECTED_TOTAL.inc(provider=self.name)
+            raise
+        self.in_flight += 1
+        return trial
+
+    def _release(self, trial: bool) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+        if trial:
+            self.breaker.end_trial()
+
+    async def generate(self, prompt: Prompt, tools: Optional[List[dict]] = None, tool_mode: str = "auto") -> LLMResult:
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            trial = await self._acquire(deadline)
+            try:
+                async with asyncio.timeout(max(deadline - time.monotonic(), 0)):
+                    result = await self.provider.generate(prompt, tools, tool_mode)
+            except Exception as error:
+                backoff = self._failed(error, attempt, deadline)
+                if backoff is None:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                # Also runs on cancellation, which records neither outcome
+                self._release(trial)
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    async def stream(self, prompt: Prompt, result: LLMResult, tools: Optional[List[dict]] = None,
+                     tool_mode: str = "auto") -> AsyncIterator[str]:
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            trial = await self._acquire(deadline)
+            started = False
+            chunks = self.provider.stream(prompt, result, tools, tool_mode)
+            try:
+                while True:
+                    # The deadline applies to each wait for the next chunk, never across a `yield`
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), max(deadline - time.monotonic(), 0))
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    yield chunk
+            except Exception as error:
+                if started:
+                    # Part of the answer is already out; it cannot be retried
+                    if is_transient(error):
+                        self.breaker.record_failure()
+                    raise
+                backoff = self._failed(error, attempt, deadline)
+                if backoff is None:
+                    raise
+            else:
+                self.breaker.record_success()
+                return
+            finally:
+                # Also runs on cancellation and on GeneratorExit (the consumer went away)
+                try:
+                    await chunks.aclose()
+                finally:
+                    self._release(trial)
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "consecutive_failures": self.breaker.failures,
+            "circuit_open": int(self.breaker.state != "closed"),
+        }
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+
+def create_provider() -> ResilientProvider:
+    """Builds the provider selected by LLM_PROVIDER, wrapped with the resilience settings."""
+    if LLM_PROVIDER == "mock":
+        provider: LLMProvider = MockProvider()
+    elif LLM_PROVIDER == "openai":
+        provider = OpenAICompatibleProvider(LLM_BASE_URL, LLM_MODEL or "gpt-4o-mini", LLM_API_KEY)
+    elif LLM_PROVIDER == "gemini":
+        # Try GOOGLE_API_KEY first, then fallback to GEMINI_API_KEY
+        api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("錯誤：未設定 Gemini/Google API 金鑰，請檢查 .env 檔案並確保設定 GOOGLE_API_KEY 或 GEMINI_API_KEY。")
+        provider = GeminiProvider(LLM_MODEL or "gemini-2.5-flash", api_key)
+    else:
+        raise RuntimeError(f"Unknown LLM_PROVIDER '{LLM_PROVIDER}', expected gemini, openai or mock")
+    return ResilientProvider(provider)
@@ -1,54 +1,155 @@
 import os
 import json
+import time
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 from dotenv import load_dotenv
-import google.generativeai as genai
 from sqlalchemy.orm import Session
 from . import crud, models
+from .catalog import catalog, CatalogSnapshot, SystemEntry
+from .catalog_index import catalog_index
+from .response_cache import normalize_prompt, response_cache
+from .singleflight import SingleFlight
+from .serialization import RowSet, encode
+from . import log
+from .metrics import LLM_CALLS, LLM_ERRORS, STAGE_SECONDS, TEMPLATED_ANSWERS, record_llm_usage, span
 
 load_dotenv()
 
+# Imported after load_dotenv(): the provider settings are read from the environment
+from .llm_providers import LLMProvider, LLMResult, create_provider, prompt_text
+
+logger = logging.getLogger(__name__)
+
+# "two_call": the intent is returned as JSON text and the data is summarized by a second prompt.
+# "function_calling": the crud functions are declared as native tools; the model's function calls
+# are the intent, and the answer continues the same conversation with the function responses,
+# or is rendered from a template (counts, single rows, no rows) without a second call.
+QNA_PIPELINE = os.getenv("QNA_PIPELINE", "two_call").lower()
+
+OPEN_APPLICATION_TOOL = "open_application"
+FILTER_VALUE_HINT = (
+    "篩選值：單一值、範圍字串 (例如 \">=1000\"、\"30-40\"、\"2024-01-01~2024-03-31\")，"
+    "日期可只寫到年或月 (例如 \"2024-03\")"
+)
+# Narrower hints for numeric and date columns (see crud.ToolSpec.filter_kinds)
+FILTER_KIND_HINTS = {
+    "number": "數值篩選：單一值或範圍字串 (例如 \">=1000\"、\"30-40\")",
+    "date": "日期篩選：單一日期或範圍字串 (例如 \"2024-01-01~2024-03-31\")，可只寫到年或月 (例如 \"2024-03\")",
+}
+METRIC_LABELS = {"count": "筆數", "sum": "總和", "avg": "平均值", "min": "最小值", "max": "最大值"}
+# Shared by both pipelines' second call: how to read the compacted tool results
+DATA_FORMAT_NOTE = (
+    "數據說明: `format` 為 csv 時，`rows` 為含標題列的 CSV，`constant_columns` 為所有資料都相同的欄位值，"
+    "`stats` 為取回的 `total_rows` 筆資料的統計；若 `shown_rows` 小於 `total_rows`，表示只提供了部分資料。"
+    "若 `truncated` 為 true，表示符合條件的資料不只 `total_rows` 筆，`stats` 並非全部資料的統計："
+    "請說明結果不完整，並建議用戶直接詢問筆數、總和或平均 (將以統計函數計算全部資料)。"
+    "其餘情況請以 `stats` 回答統計問題，並依 `note` 建議用戶縮小查詢範圍。"
+)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    return str(value)
+
+
+def template_answer(tool_results: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Renders the answer directly when every tool result is trivially readable: no rows,
+    a single ungrouped aggregate value, or a single row. Returns None when the model is needed.
+    """
+    lines = []
+    for result in tool_results:
+        data = result.get("data")
+        if "error" in result or data is None:
+            return None
+        system_name = result.get("system_name") or result.get("function_name")
+        if len(data) == 0:
+            lines.append(f"查無符合條件的{system_name}資料。")
+            continue
+        if len(data) != 1 or not isinstance(data, RowSet):
+            return None
+        row = data.as_dicts()[0]
+        if result.get("function_name") in crud.AGGREGATE_TOOLS:
+            if set(row) != {"metric", "column", "value"}:
+                return None  # grouped
+            if row["value"] is None:
+                lines.append(f"查無符合條件的{system_name}資料。")
+            elif row["metric"] == "count":
+                lines.append(f"符合條件的{system_name}資料共 {_format_value(row['value'])} 筆。")
+            else:
+                label = METRIC_LABELS.get(row["metric"], row["metric"])
+                lines.append(f"符合條件的{system_name}資料，{row['column']} 的{label}為 {_format_value(row['value'])}。")
+        else:
+            fields = "、".join(f"{key}: {_format_value(value)}" for key, value in row.items() if value is not None and key != "id")
+            lines.append(f"查詢到 1 筆{system_name}資料：{fields}。")
+    return "\n".join(lines) if lines else None
+
+
 class ERPAssistant:
-    def __init__(self):
-        # Try GOOGLE_API_KEY first, then fallback to GEMINI_API_KEY
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
-            self.api_key = os.getenv("GEMINI_API_KEY")
-
-        if not self.api_key:
-            raise RuntimeError("錯誤：未設定 Gemini/Google API 金鑰，請檢查 .env 檔案並確保設定 GOOGLE_API_KEY 或 GEMINI_API_KEY。")
-        
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        print(f"DEBUG: ERPAssistant initialized. Model: {self.model}")
-
-    async def get_question_scope(self, user_prompt: str, db: Session) -> dict:
-        print(f"DEBUG: get_question_scope called. Model: {self.model}")
+    def __init__(self, provider: Optional[LLMProvider] = None, pipeline: str = QNA_PIPELINE):
+        # The backend (Gemini, an OpenAI-compatible server or the mock) is chosen by LLM_PROVIDER
+        self.provider = provider or create_provider()
+        if pipeline not in ("two_call", "function_calling"):
+            raise RuntimeError(f"Unknown QNA_PIPELINE '{pipeline}', expected two_call or function_calling")
+        self.function_calling = pipeline == "function_calling"
+        # Concurrent identical questions share one intent call, and identical answers one answer call
+        self.intent_flight = SingleFlight()
+        self.answer_flight = SingleFlight()
+        logger.info("ERPAssistant initialized, provider %s, model %s, pipeline %s",
+                    self.provider.name, self.provider.model_name, pipeline)
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
+
+    @staticmethod
+    def _describe_system(info: SystemEntry) -> tuple:
+        """(application description or None, tool description) of one catalog entry for the system prompt."""
+        # For "open application" intent
+        application_description = None
+        if info.frontend_route_name:
+            application_description = f"- 應用程式名稱: {info.system_name}\n  - 路由名稱: `{info.frontend_route_name}`"
+
+        # For "ask system question" intent
+        description = f"- 系統名稱: {info.system_name}\n  - 函數名稱: `{info.data_query_function_name}`"
+        if info.filterable_columns:
+            description += f"\n  - 可用篩選欄位: {list(info.filterable_columns)}"
+        elif info.filterable_columns_raw:
+            description += f"\n  - 可用篩選欄位: {info.filterable_columns_raw}" # Fallback
+        aggregate_tool = crud.AGGREGATE_TOOLS.get(info.data_query_function_name)
+        if aggregate_tool:
+            description += (
+                f"\n  - 彙總函數: `metric` 可為 {list(crud.AGGREGATE_METRICS)}"
+                f"\n  - 可彙總欄位 (`column`): {aggregate_tool['columns']}"
+                f"\n  - 可分組欄位 (`group_by`): {aggregate_tool['group_by']}"
+            )
+        if info.data_query_function_name in crud.SEARCH_TOOLS:
+            description += "\n  - 語意搜尋: 以 `query` 提供自然語言描述 (如部分姓名、地址)，可選 `top_k` 筆數"
+        return application_description, description
+
+    def _build_system_prompt(self, snapshot: CatalogSnapshot, systems: Optional[Sequence[SystemEntry]] = None) -> str:
         """
-        Processes the user's prompt to determine intent (open application or ask system question)
-        and extracts relevant information (frontend route or data query parameters).
+        Renders the intent-detection system prompt for one catalog version, describing only
+        `systems` (the entries retrieved for the question; default: the whole catalog).
+        The per-system descriptions and the whole-catalog prompt are memoized on the snapshot,
+        so they are rebuilt only after the catalog changes.
         """
-        # Fetch all system info from the database to build the dynamic prompt
-        system_infos = crud.get_all_system_info(db)
-
-        application_descriptions = []
-        tool_descriptions = []
-
-        for info in system_infos:
-            # For "open application" intent
-            if info.frontend_route_name:
-                application_descriptions.append(
-                    f"- 應用程式名稱: {info.system_name}\n  - 路由名稱: `{info.frontend_route_name}`"
-                )
-            
-            # For "ask system question" intent
-            description = f"- 系統名稱: {info.system_name}\n  - 函數名稱: `{info.data_query_function_name}`"
-            if info.filterable_columns:
-                try:
-                    columns = json.loads(info.filterable_columns)
-                    description += f"\n  - 可用篩選欄位: {columns}"
-                except json.JSONDecodeError:
-                    description += f"\n  - 可用篩選欄位: {info.filterable_columns}" # Fallback
-            tool_descriptions.append(description)
+        whole_catalog = systems is None or len(systems) == len(snapshot.systems)
+        cached = snapshot.derived.get("system_prompt")
+        if whole_catalog and cached is not None:
+            return cached
+
+        descriptions = snapshot.derived.get("system_descriptions")
+        if descriptions is None:
+            descriptions = snapshot.derived["system_descriptions"] = {
+                info.system_name: self._describe_system(info) for info in snapshot.systems
+            }
+        selected = [descriptions[info.system_name] for info in (snapshot.systems if whole_catalog else systems)]
+        application_descriptions = [application for application, _ in selected if application]
+        tool_descriptions = [tool for _, tool in selected]
 
         system_prompt = f"""
 你是一個強大的企業助理，你的任務是根據用戶的問題，判斷其意圖並提供相應的回應。
@@ -124,78 +225,356 @@ class ERPAssistant:
 }}
 ```
 
+## 範例 3: 統計問題
+用戶問題: "2024年3月的訂單總金額是多少？"
+你的 JSON 回答:
+```json
+{{
+  "request_type": "ASK_SYSTEM_QUESTION",
+  "llm_text_response": "好的，正在為您計算2024年3月的訂單總金額。",
+  "tool_calls": [
+    {{
+      "function_name": "aggregate_orders",
+      "system_name": "訂單統計",
+      "parameters": {{
+        "metric": "sum",
+        "column": "order_amount",
+        "order_date": "2024-03"
+      }}
+    }}
+  ]
+}}
+```
+
 # 重要規則
+- 數值與日期欄位的篩選值可以是單一值、列表 (任一值)、範圍字串 (例如 ">=1000"、"30-40"、"2024-01-01~2024-03-31")，或運算子物件 (例如 {{"gte": 30, "lte": 40}}、{{"between": ["2024-01", "2024-03"]}})；日期可只寫到年或月 (例如 "2024-03" 表示整個三月)。
+- 對於計數、加總、平均、最大值、最小值或分組統計的問題，若有對應的「彙總函數」，請優先使用它，並在 `parameters` 中提供 `metric`、`column` (計數時可省略) 與 `group_by` (不分組時省略)，其餘鍵值為篩選條件。
 - 如果用戶問題沒有提供任何可以用於篩選的值，`parameters` 應為空物件 `{{}}`。
 - 如果沒有判斷出明確意圖或無法提取所需資訊，`request_type` 應設定為 "UNKNOWN" 並提供 `llm_text_response`。
 - 你的回答只能是 JSON，不要包含任何額外的文字或解釋。
 """
+        if whole_catalog:
+            snapshot.derived["system_prompt"] = system_prompt
+        return system_prompt
+
+    def _build_tool_declarations(self, snapshot: CatalogSnapshot, systems: Sequence[SystemEntry]) -> List[dict]:
+        """
+        Function declarations for the query functions of `systems` plus `open_application`.
+        The query function declarations are memoized on the snapshot like the system prompt.
+        """
+        function_declarations = snapshot.derived.get("tool_declarations")
+        if function_declarations is None:
+            function_declarations = snapshot.derived["tool_declarations"] = self._build_function_declarations(snapshot)
+
+        declarations = []
+        routes = {info.frontend_route_name: info.system_name for info in systems if info.frontend_route_name}
+        if routes:
+            declarations.append({
+                "name": OPEN_APPLICATION_TOOL,
+                "description": "開啟應用程式頁面。可開啟: " + "、".join(f"{name} ({route})" for route, name in routes.items()),
+                "parameters": {
+                    "type": "object",
+                    "properties": {"frontend_route_name": {"type": "string", "enum": list(routes), "description": "路由名稱"}},
+                    "required": ["frontend_route_name"],
+                },
+            })
+        functions = {info.data_query_function_name for info in systems}
+        return declarations + [declaration for name, declaration in function_declarations.items() if name in functions]
 
-        print("--- LLM INTERACTION WITH GOOGLE GEMINI (TOOL CALL) ---")
-        print(f"System Prompt: {system_prompt}")
-        print(f"User Prompt: {user_prompt}")
+    @staticmethod
+    def _build_function_declarations(snapshot: CatalogSnapshot) -> Dict[str, dict]:
+        """Function name -> declaration of every registered tool (crud.TOOLS) in the catalog."""
+        declarations: Dict[str, dict] = {}
+        for info in snapshot.systems:
+            function_name = info.data_query_function_name
+            spec = crud.TOOLS.get(function_name)
+            if function_name in declarations or spec is None:
+                continue
+            properties = {
+                column: {"type": "string", "description": FILTER_KIND_HINTS.get(spec.filter_kinds.get(column), FILTER_VALUE_HINT)}
+                for column in info.filterable_columns
+            }
+            description = f"查詢「{info.system_name}」的資料，參數皆為篩選條件 (可省略)。"
+            aggregate_tool = crud.AGGREGATE_TOOLS.get(function_name)
+            if aggregate_tool:
+                description = f"計算「{info.system_name}」的統計值 (計數、加總、平均、最大值、最小值，可分組)，其餘參數為篩選條件。"
+                properties.update({
+                    "metric": {"type": "string", "enum": list(crud.AGGREGATE_METRICS), "description": "彙總函數"},
+                    "column": {"type": "string", "enum": aggregate_tool["columns"], "description": "彙總欄位 (計數時可省略)"},
+                    "group_by": {"type": "string", "enum": aggregate_tool["group_by"], "description": "分組欄位 (不分組時省略)"},
+                })
+            if function_name in crud.SEARCH_TOOLS:
+                description = f"以自然語言模糊搜尋「{info.system_name}」中最相似的資料，其餘參數為篩選條件。"
+                properties.update({
+                    "query": {"type": "string", "description": "要搜尋的描述，如部分姓名、地址或信箱"},
+                    "top_k": {"type": "integer", "description": "回傳筆數 (可省略)"},
+                })
+            declaration = {"name": function_name, "description": description}
+            if properties:
+                declaration["parameters"] = {"type": "object", "properties": properties}
+            declarations[function_name] = declaration
+        return declarations
+
+    @staticmethod
+    def _build_function_calling_prompt(user_prompt: str) -> str:
+        return (
+            "你是一個企業助理。若用戶想開啟某個應用程式或頁面，請呼叫 `open_application`；"
+            "若用戶想查詢系統資料，請呼叫對應的查詢函數 (可同時呼叫多個)，並只填入用戶問題中提到的篩選條件；"
+            "計數、加總、平均、最大值、最小值或分組統計的問題，若有對應的統計函數請優先使用。"
+            "若無法判斷意圖，請直接用繁體中文回覆用戶。\n\n"
+            f"用戶問題: {user_prompt}"
+        )
+
+    async def get_question_scope(self, user_prompt: str, db) -> dict:
+        """
+        Processes the user's prompt to determine intent (open application or ask system question)
+        and extracts relevant information (frontend route or data query parameters).
+        """
+        # The catalog is cached in memory; the DB is only read after a SystemInfo write
+        snapshot = await catalog.get_async(db)
+
+        # Identical (normalized) questions against the same catalog version skip the LLM call
+        cached_response = await response_cache.get_intent(user_prompt, snapshot.version)
+        if cached_response is not None:
+            return cached_response
+
+        ask = self._get_question_scope_with_tools if self.function_calling else self._get_question_scope_from_text
+        return await self.intent_flight.do(
+            (snapshot.version, normalize_prompt(user_prompt)), lambda: ask(user_prompt, snapshot)
+        )
+
+    async def _get_question_scope_from_text(self, user_prompt: str, snapshot: CatalogSnapshot) -> dict:
+        """`get_question_scope` for the two-call pipeline: the intent is parsed from the JSON reply."""
+        # Only the systems relevant to the question are described (see catalog_index.py)
+        with span("retrieval"):
+            systems = catalog_index.select(snapshot, user_prompt)
+        system_prompt = self._build_system_prompt(snapshot, systems)
+
+        logger.debug("Gemini tool call, user prompt: %s", user_prompt)
+        log.payload(logger, "Gemini tool call, system prompt (%d chars): %s", len(system_prompt), system_prompt)
 
         try:
-            messages = [
-                {"role": "user", "parts": [system_prompt + "\n\n用戶問題: " + user_prompt]},
-            ]
-
-            response = await self.model.generate_content_async(messages)
-            llm_response_content = response.text
-            print(f"Raw LLM Response (Tool Call): {llm_response_content}")
-
-            # Pre-process: Strip markdown code block delimiters if present
-            if llm_response_content.strip().startswith("```json"):
-                llm_response_content = llm_response_content.strip()[len("```json"):].strip()
-                if llm_response_content.endswith("```"):
-                    llm_response_content = llm_response_content[:-len("```")].strip()
-            
-            parsed_response = {} # Initialize parsed_response to ensure it's always a dict
-            try:
-                parsed_response = json.loads(llm_response_content)
-                llm_text_response = parsed_response.get("llm_text_response", llm_response_content)
-                tool_calls = parsed_response.get("tool_calls", [])
-                if not isinstance(tool_calls, list):
-                    tool_calls = []
-                    print("Warning: 'tool_calls' from LLM was not a list. Ignoring tool calls.")
-            except json.JSONDecodeError:
-                llm_text_response = llm_response_content
-                tool_calls = []
-                print("Warning: LLM response was not a valid JSON string. Treating as plain text and no tool calls.")
-                # When JSON decoding fails, parsed_response remains an empty dict, so defaults will be used.
+            prompt = system_prompt + "\n\n用戶問題: " + user_prompt
+
+            LLM_CALLS.inc(call="intent")
+            with span("llm_intent"):
+                response = await self.provider.generate(prompt)
+                llm_response_content = response.text
+            record_llm_usage("intent", prompt, llm_response_content, response)
+            log.payload(logger, "Raw LLM response (tool call): %s", llm_response_content)
 
-            return {
+            with span("parse"):
+                parsed_response, llm_text_response, tool_calls, parsed_ok = self._parse_intent_response(llm_response_content)
+
+            result = {
                 "request_type": parsed_response.get("request_type", "UNKNOWN"),
                 "llm_text_response": llm_text_response,
                 "tool_calls": tool_calls,
                 "frontend_route_name": parsed_response.get("frontend_route_name"),
             }
+            # Only well-formed responses are cached, so a bad generation is retried next time
+            if parsed_ok:
+                await response_cache.set_intent(user_prompt, snapshot.version, result)
+            return result
 
         except Exception as e:
-            print(f"Error calling Gemini LLM (Tool Call): {e}")
+            LLM_ERRORS.inc(call="intent")
+            logger.exception("Error calling Gemini LLM (tool call)")
             return {"llm_text_response": f"我目前無法連接到 Gemini 服務或處理請求: {e}", "tool_calls": [], "request_type": "UNKNOWN"}
 
-    async def get_llm_final_answer(self, original_prompt: str, retrieved_data_json: dict) -> str:
-        print("--- LLM INTERACTION WITH GOOGLE GEMINI (FINAL ANSWER) ---")
+    @staticmethod
+    def _parse_intent_response(llm_response_content: str):
+        """Returns (parsed_response, llm_text_response, tool_calls, parsed_ok) for the raw intent reply."""
+        # Pre-process: Strip markdown code block delimiters if present
+        if llm_response_content.strip().startswith("```json"):
+            llm_response_content = llm_response_content.strip()[len("```json"):].strip()
+            if llm_response_content.endswith("```"):
+                llm_response_content = llm_response_content[:-len("```")].strip()
 
+        parsed_response = {} # Initialize parsed_response to ensure it's always a dict
+        parsed_ok = False
         try:
-            
-            summarization_prompt = (
-                f"你是一個智能助理，請根據以下用戶問題和所提供的數據，用繁體中文生成一個清晰、簡潔的回答。\n"
-                f"用戶問題: {original_prompt}\n"
-                f"查詢到的數據: {json.dumps(retrieved_data_json, ensure_ascii=False, indent=2)}\n\n"
-                f"請整合這些資訊並直接提供最終答案，不要提到數據來源或數據本身，只需提供回答。"
-            )
+            parsed_response = json.loads(llm_response_content)
+            llm_text_response = parsed_response.get("llm_text_response", llm_response_content)
+            tool_calls = parsed_response.get("tool_calls", [])
+            if not isinstance(tool_calls, list):
+                tool_calls = []
+                logger.warning("'tool_calls' from LLM was not a list. Ignoring tool calls.")
+            parsed_ok = True
+        except json.JSONDecodeError:
+            llm_text_response = llm_response_content
+            tool_calls = []
+            logger.warning("LLM response was not a valid JSON string. Treating as plain text and no tool calls.")
+            # When JSON decoding fails, parsed_response remains an empty dict, so defaults will be used.
+        return parsed_response, llm_text_response, tool_calls, parsed_ok
+
+    async def _get_question_scope_with_tools(self, user_prompt: str, snapshot: CatalogSnapshot) -> dict:
+        """
+        `get_question_scope` for the function-calling pipeline: the model's function calls are
+        read from the structured response, so there is no JSON to strip and parse.
+        """
+        prompt = self._build_function_calling_prompt(user_prompt)
+        logger.debug("Function calling intent call, user prompt: %s", user_prompt)
+        with span("retrieval"):
+            tools = self._build_tool_declarations(snapshot, catalog_index.select(snapshot, user_prompt))
+
+        try:
+            LLM_CALLS.inc(call="intent")
+            with span("llm_intent"):
+                response = await self.provider.generate(prompt, tools=tools)
+            record_llm_usage("intent", prompt, response.text, response)
+            log.payload(logger, "Function calls: %s, text: %s", response.function_calls, response.text)
+
+            result = {"request_type": "UNKNOWN", "llm_text_response": response.text, "tool_calls": [], "frontend_route_name": None}
+            for call in response.function_calls:
+                if call["name"] == OPEN_APPLICATION_TOOL:
+                    route = call["args"].get("frontend_route_name")
+                    result.update(request_type="OPEN_APPLICATION", frontend_route_name=route)
+                    result["llm_text_response"] = response.text or f"好的，正在為您打開{route}頁面。"
+                    break
+                info = snapshot.by_function(call["name"])
+                result["tool_calls"].append({
+                    "function_name": call["name"],
+                    "system_name": info.system_name if info else "未知系統",
+                    "parameters": call["args"],
+                })
+            if result["tool_calls"]:
+                result["request_type"] = "ASK_SYSTEM_QUESTION"
+                result["llm_text_response"] = response.text or "好的，正在為您查詢資料。"
+
+            # Same shape as the two-call pipeline's intent, so it shares the intent cache
+            await response_cache.set_intent(user_prompt, snapshot.version, result)
+            return result
+
+        except Exception as e:
+            LLM_ERRORS.inc(call="intent")
+            logger.exception("Error calling LLM (function calling)")
+            return {"llm_text_response": f"我目前無法連接到 LLM 服務或處理請求: {e}", "tool_calls": [], "request_type": "UNKNOWN"}
 
-            messages = [
-                {"role": "user", "parts": [summarization_prompt]},
-            ]
+    @staticmethod
+    def _build_summarization_prompt(original_prompt: str, retrieved_data_json) -> str:
+        summarization_prompt = (
+            f"你是一個智能助理，請根據以下用戶問題和所提供的數據，用繁體中文生成一個清晰、簡潔的回答。\n"
+            f"用戶問題: {original_prompt}\n"
+            f"查詢到的數據: {encode(retrieved_data_json).decode('utf-8')}\n\n"
+            f"{DATA_FORMAT_NOTE}\n\n"
+            f"請整合這些資訊並直接提供最終答案，不要提到數據來源或數據本身，只需提供回答。"
+        )
 
-            response = await self.model.generate_content_async(messages)
-            final_answer = response.text
-            print(f"Final LLM Answer: {final_answer}")
+        return summarization_prompt
+
+    @staticmethod
+    def _build_function_response_conversation(original_prompt: str, tool_calls: List[dict],
+                                              retrieved_data_json: List[dict]):
+        """
+        (conversation, tool declarations) continuing the function-calling turn with the function responses.
+        Rebuilt from the tool calls, so it also works for a cached intent; the declarations only
+        cover the functions that were called, since no further calls are allowed.
+        """
+        calls = [{"id": f"call_{i}", "name": call["function_name"], "args": call.get("parameters") or {}}
+                 for i, call in enumerate(tool_calls)]
+        # Compacted results are plain JSON apart from RowSets; function responses must be JSON objects
+        responses = json.loads(encode(retrieved_data_json))
+        conversation: List[dict] = [
+            {"role": "user", "text": (
+                "你是一個智能助理，請根據函數回傳的數據，用繁體中文生成一個清晰、簡潔的回答，"
+                f"不要提到數據來源或數據本身。\n{DATA_FORMAT_NOTE}\n\n用戶問題: {original_prompt}"
+            )},
+            {"role": "model", "function_calls": calls},
+        ]
+        conversation += [
+            {"role": "function", "id": call["id"], "name": call["name"], "response": response}
+            for call, response in zip(calls, responses)
+        ]
+        declarations = {}
+        for call in calls:
+            declaration = declarations.setdefault(call["name"], {"name": call["name"], "description": call["name"]})
+            if call["args"]:
+                properties = declaration.setdefault("parameters", {"type": "object", "properties": {}})["properties"]
+                properties.update({key: {"type": "string"} for key in call["args"]})
+        return conversation, list(declarations.values())
+
+    def _answer_prompt(self, original_prompt: str, retrieved_data_json, tool_calls: Optional[List[dict]]):
+        """(prompt, tools) of the answer call for the configured pipeline."""
+        if self.function_calling and tool_calls and len(tool_calls) == len(retrieved_data_json):
+            return self._build_function_response_conversation(original_prompt, tool_calls, retrieved_data_json)
+        return self._build_summarization_prompt(original_prompt, retrieved_data_json), None
+
+    def template_answer(self, tool_results: List[Dict[str, Any]]) -> Optional[str]:
+        """The templated answer, when the function-calling pipeline can skip the answer call."""
+        if not self.function_calling:
+            return None
+        answer = template_answer(tool_results)
+        if answer is not None:
+            TEMPLATED_ANSWERS.inc()
+        return answer
+
+    async def get_llm_final_answer(self, original_prompt: str, retrieved_data_json: dict,
+                                   tool_calls: Optional[List[dict]] = None) -> str:
+        logger.debug("Gemini final answer call")
+
+        # Same question over the same data gives the same answer
+        cached_answer = await response_cache.get_answer(original_prompt, retrieved_data_json)
+        if cached_answer is not None:
+            return cached_answer
+
+        return await self.answer_flight.do(
+            response_cache.answer_key(original_prompt, retrieved_data_json),
+            lambda: self._generate_final_answer(original_prompt, retrieved_data_json, tool_calls),
+        )
+
+    async def _generate_final_answer(self, original_prompt: str, retrieved_data_json: dict,
+                                     tool_calls: Optional[List[dict]]) -> str:
+        try:
+            prompt, tools = self._answer_prompt(original_prompt, retrieved_data_json, tool_calls)
+
+            LLM_CALLS.inc(call="answer")
+            with span("llm_answer"):
+                response = await self.provider.generate(prompt, tools, tool_mode="none")
+                final_answer = response.text
+            record_llm_usage("answer", prompt_text(prompt), final_answer, response)
+            log.payload(logger, "Final LLM answer: %s", final_answer)
+            await response_cache.set_answer(original_prompt, retrieved_data_json, final_answer)
             return final_answer
 
         except Exception as e:
-            print(f"Error calling Gemini LLM (Final Answer): {e}")
+            LLM_ERRORS.inc(call="answer")
+            logger.exception("Error calling Gemini LLM (final answer)")
             return f"在生成最終回答時發生錯誤: {e}"
 
+    async def stream_llm_final_answer(self, original_prompt: str, retrieved_data_json: dict,
+                                      tool_calls: Optional[List[dict]] = None) -> AsyncIterator[str]:
+        """
+        Same as `get_llm_final_answer`, but yields the answer in chunks as Gemini generates it.
+        A cached answer is yielded as a single chunk.
+        """
+        logger.debug("Gemini final answer call (streaming)")
+
+        cached_answer = await response_cache.get_answer(original_prompt, retrieved_data_json)
+        if cached_answer is not None:
+            yield cached_answer
+            return
+
+        try:
+            prompt, tools = self._answer_prompt(original_prompt, retrieved_data_json, tool_calls)
+
+            LLM_CALLS.inc(call="answer")
+            started = time.perf_counter()
+            response = LLMResult()
+            chunks = []
+            async for chunk in self.provider.stream(prompt, response, tools, tool_mode="none"):
+                if not chunks:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_answer_first_chunk")
+                chunks.append(chunk)
+                yield chunk
+
+            final_answer = "".join(chunks)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_answer")
+            record_llm_usage("answer", prompt_text(prompt), final_answer, response)
+            log.payload(logger, "Final LLM answer: %s", final_answer)
+            await response_cache.set_answer(original_prompt, retrieved_data_json, final_answer)
+
+        except Exception as e:
+            LLM_ERRORS.inc(call="answer")
+            logger.exception("Error calling Gemini LLM (final answer)")
+            yield f"在生成最終回答時發生錯誤: {e}"
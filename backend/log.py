@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Optional
+
+# Level for the application loggers (DEBUG enables the payload logs below)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line, for fly.io log shipping) or "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of verbose payload records (prompts, raw LLM output, row dumps) that are kept
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
+
+# Parent of every module logger created with logging.getLogger(__name__) in this package
+PACKAGE_LOGGER = __name__.rpartition(".")[0] or __name__
+# Attributes every LogRecord has; anything else was passed through `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "payload"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class PayloadSampler(logging.Filter):
+    """Keeps only a sample of the records logged with extra={"payload": True}."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "payload", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues the record as is. The stock `prepare` formats the message and exception in the
+    calling thread (to make the record picklable); the queue never leaves this process, so
+    that is left to the listener. Log arguments are therefore rendered when the record is
+    written, which callers must not mutate afterwards.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def payload(logger: logging.Logger, msg: str, *args) -> None:
+    """
+    Logs a verbose payload at DEBUG, subject to LOG_PAYLOAD_SAMPLE_RATE.
+    Arguments are only formatted if the record is kept; callers whose arguments are
+    themselves expensive to build should check `logger.isEnabledFor(logging.DEBUG)` first.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, extra={"payload": True})
+
+
+def setup_logging() -> None:
+    """
+    Routes the package loggers through a DeferredQueueHandler: request threads only enqueue the
+    record, and a background QueueListener does the formatting and the stdout write.
+    Records below LOG_LEVEL are rejected by `isEnabledFor` before they are created. Idempotent.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+    # The sampler runs before the record is enqueued, so dropped payloads are never formatted
+    queue_handler.addFilter(PayloadSampler(LOG_PAYLOAD_SAMPLE_RATE))
+
+    package_logger = logging.getLogger(PACKAGE_LOGGER)
+    package_logger.setLevel(LOG_LEVEL)
+    package_logger.addHandler(queue_handler)
+    package_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued on shutdown
+    atexit.register(_listener.stop)
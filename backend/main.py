@@ -1,19 +1,52 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.exc import DatabaseError
 from sqlalchemy.orm import Session
 import json
-import inspect
+import asyncio
+import logging
+import time
 
 from . import crud, models, schemas
-from .database import SessionLocal, engine
+from .log import setup_logging
+from . import metrics
+from .metrics import span
+from .database import SessionLocal, engine, pool_stats, async_session, get_async_db, dispose_engines
+from .catalog import catalog, CatalogSnapshot, CATALOG_POLL_INTERVAL
 ## from .llm_service import get_llm_response_with_tool_call, get_llm_final_answer # Import new summarization function
 from .llm_service import ERPAssistant
+from .response_cache import response_cache
+from .intent_router import intent_router
+from .catalog_index import catalog_index
+from .tool_registry import tool_registry
+from .compaction import compact_tool_results
+from .serialization import RowSet, encode
+from .singleflight import SingleFlight, parameters_key
+from .query_cache import query_cache
+from .text_search import setup_text_search
+from .vector_index import index_stats, flush_indexes, VECTOR_INDEX_SYNC_INTERVAL
 from .routers import employees, orders, system_info # Import the new routers
+from .routers.pagination import CURSOR_HEADERS
 
 
+setup_logging()
+logger = logging.getLogger(__name__)
 
-models.Base.metadata.create_all(bind=engine)
+def _create_schema(attempts: int = 5) -> None:
+    # Workers starting together race between create_all's existence check and its CREATE TABLE;
+    # the table another worker just created is skipped on the next pass
+    for attempt in range(attempts):
+        try:
+            models.Base.metadata.create_all(bind=engine)
+            return
+        except DatabaseError:
+            if attempt == attempts - 1:
+                raise
+
+_create_schema()
+setup_text_search(engine)
 
 app = FastAPI()
 
@@ -32,13 +65,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # 允許所有方法 (GET, POST, PUT, DELETE 等)
     allow_headers=["*"],  # 允許所有標頭
+    expose_headers=CURSOR_HEADERS,  # 讓前端讀得到分頁游標
 )
 
 
-# Global map to store dynamically loaded functions and system info
-FUNCTION_MAP: Dict[str, Any] = {}
-SYSTEM_INFO_MAP: Dict[str, models.SystemInfo] = {}
-CONTEXT_LENGTH_LIMIT = 8000  # Max characters for data to be sent to LLM
+# Concurrent identical (function_name, parameters) tool calls share one query and its encoded rows
+tool_flight = SingleFlight()
+
+# Background catch-up of the semantic search indexes with rows written elsewhere (see crud/semantic.py)
+_index_sync_task = None
+# Polls the catalog's version row for SystemInfo writes made by other workers
+_catalog_watch_task = None
 
 # Dependency to get the DB session
 def get_db():
@@ -50,25 +87,66 @@ def get_db():
 
 @app.on_event("startup")
 async def startup_event():
-    print("Application startup event: Populating FUNCTION_MAP and SYSTEM_INFO_MAP.")
+    logger.info("Application startup event: Building the tool registry.")
+    db = SessionLocal()
+    try:
+        snapshot = await asyncio.to_thread(catalog.get, db)
+        if not snapshot.systems:
+            logger.warning(
+                "No SystemInfo found in DB. Please add some via /api/system_info/ endpoint. "
+                "Example: system_name='員工管理', data_query_function_name='get_employees', "
+                "filterable_columns='[\"name\", \"address\"]', frontend_route_name='employees'"
+            )
+        # Rebuilt after each catalog write; warns about catalog functions without a registered tool
+        tool_registry.sync(snapshot)
+    finally:
+        db.close()
+    logger.info("Tool registry built: %s", list(crud.TOOLS))
+
+    # Rows added while the server was down, by bulk imports or by other workers are embedded
+    # in the background, never on a search
+    global _index_sync_task, _catalog_watch_task
+    _index_sync_task = asyncio.create_task(_watch_vector_indexes(VECTOR_INDEX_SYNC_INTERVAL))
+    if CATALOG_POLL_INTERVAL > 0:
+        _catalog_watch_task = asyncio.create_task(catalog.watch(SessionLocal))
+
+
+def _sync_vector_indexes(check_ids: bool = False):
     db = SessionLocal()
     try:
-        system_infos = crud.get_all_system_info(db)
-        if not system_infos:
-            print("No SystemInfo found in DB. Please add some via /api/system_info/ endpoint.")
-            print("Example: system_name='員工管理', data_query_function_name='get_employees', filterable_columns='[\"name\", \"address\"]', frontend_route_name='employees'")
-
-        for info in system_infos:
-            func_name = info.data_query_function_name
-            if hasattr(crud, func_name) and inspect.isfunction(getattr(crud, func_name)):
-                FUNCTION_MAP[func_name] = getattr(crud, func_name)
-                SYSTEM_INFO_MAP[func_name] = info # Cache the whole info object
-                print(f"Mapped function: {func_name}")
-            else:
-                print(f"Warning: Function '{func_name}' not found or not callable in crud for SystemInfo '{info.system_name}'")
+        for model in (models.Employee, models.Order):
+            if check_ids:
+                crud.check_row_ids(db, model)
+            added = crud.sync_index(db, model)
+            if added:
+                logger.info("Vector index: embedded %d new %s rows", added, model.__tablename__)
+    except Exception:
+        logger.warning("Vector index sync failed; it is retried on the next pass", exc_info=True)
     finally:
         db.close()
-    print(f"FUNCTION_MAP populated: {list(FUNCTION_MAP.keys())}")
+
+
+async def _watch_vector_indexes(interval: float) -> None:
+    """Catches the indexes up at startup, then every `interval` seconds (0: startup only)."""
+    await asyncio.to_thread(_sync_vector_indexes, True)
+    while interval > 0:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(_sync_vector_indexes)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _catalog_watch_task is not None:
+        _catalog_watch_task.cancel()
+    if _index_sync_task is not None:
+        _index_sync_task.cancel()
+        try:
+            await _index_sync_task
+        except asyncio.CancelledError:
+            pass
+    await assistant.aclose()
+    flush_indexes()
+    await dispose_engines()
 
 
 @app.get("/")
@@ -84,148 +162,258 @@ app.include_router(system_info.router, prefix="/api", tags=["system_info"])
 # 建立助理實例
 assistant = ERPAssistant()
 
+
+def _run_tool(db: Session, spec: crud.ToolSpec, arguments: Dict[str, Any], filters: Optional[Dict[str, Any]]):
+    if spec.projection:
+        # Select just the response columns as tuples; encoded once, see serialization.py
+        return RowSet(*crud.select_rows(db, spec.model, list(spec.projection), filters=filters, **arguments))
+    items = spec.func(db=db, filters=filters, **arguments) if spec.accepts_filters else spec.func(db=db, **arguments)
+    # Fallback: convert SQLAlchemy models to dicts (aggregate functions already return dicts)
+    items = [
+        item if isinstance(item, dict) else
+        {c.name: getattr(item, c.name) for c in item.__table__.columns}
+        if hasattr(item, '__table__') else str(item)
+        for item in items
+    ]
+    return RowSet.from_dicts(items) if all(isinstance(item, dict) for item in items) else items
+
+
+def _cap_rows(data, limited: bool):
+    """(data, truncated): list tools fetch one row past TOOL_ROW_LIMIT, which is dropped here."""
+    if not limited or len(data) <= crud.TOOL_ROW_LIMIT:
+        return data, False
+    if isinstance(data, RowSet):
+        return RowSet(data.columns, data.rows[:crud.TOOL_ROW_LIMIT]), True
+    return data[:crud.TOOL_ROW_LIMIT], True
+
+
+def _execute_tool_call(db: Session, snapshot: CatalogSnapshot, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executes one LLM-recommended tool call and returns its result entry. `snapshot` is resolved
+    by the caller: this runs inside `run_sync`, on the event loop thread for an async engine
+    (except for threaded tools, see run_tool_call).
+    """
+    function_name = tool_call.get("function_name")
+    parameters = tool_call.get("parameters") or {}
+    system_name = tool_call.get("system_name", "未知系統") # LLM now provides system_name
+
+    # Callable, accepted parameters, projection and catalog entry are precomputed per catalog version
+    tool = tool_registry.get(snapshot, function_name)
+    if tool is None:
+        logger.warning("Function '%s' is not a registered tool.", function_name)
+        return {
+            "system_name": system_name,
+            "function_name": function_name,
+            "error": f"LLM推薦的函數 '{function_name}' 不存在或未被映射。"
+        }
+
+    try:
+        arguments, filters = tool.split_parameters(parameters)
+        # Repeated calls are served from the query cache until a crud write bumps the table's version
+        table = tool.spec.model.__tablename__
+        data, truncated = query_cache.get_or_load(
+            table, crud.get_version(db, table),
+            (function_name, parameters_key(arguments), parameters_key(filters)),
+            lambda: _cap_rows(_run_tool(db, tool.spec, arguments, filters), "limit" in arguments),
+            weight=lambda loaded: len(encode(loaded[0])),
+        )
+
+        logger.debug("Retrieved %d records for %s.", len(data), system_name)
+
+        entry = {
+            "system_name": system_name,
+            "function_name": function_name,
+            "data": data
+        }
+        if truncated:
+            # More rows matched than TOOL_ROW_LIMIT; the data is the first TOOL_ROW_LIMIT of them
+            entry["truncated"] = True
+        return entry
+    except Exception as e:
+        logger.warning("Error executing %s: %s", function_name, e)
+        return {
+            "system_name": system_name,
+            "function_name": function_name,
+            "error": f"執行函數 '{function_name}' 失敗: {str(e)}"
+        }
+
+
+async def run_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs one tool call on its own session without blocking the event loop: awaited on the
+    async engine, or in a worker thread when there is none (see database.async_session).
+    Several calls can therefore run concurrently, and identical concurrent calls (same
+    function and parameters, from this request or others) share one query via `tool_flight`.
+    Tools doing CPU work (ToolSpec.threaded, e.g. the vector searches) always get a
+    thread-backed session, so that work never runs on the event loop.
+    """
+    spec = crud.TOOLS.get(tool_call.get("function_name"))
+
+    async def query() -> Dict[str, Any]:
+        async with async_session(threaded=spec is not None and spec.threaded) as db:
+            snapshot = await catalog.get_async(db)
+            return await db.run_sync(_execute_tool_call, snapshot, tool_call)
+
+    started = time.perf_counter()
+    function_name = tool_call.get("function_name")
+    with span("tool"):
+        result = await tool_flight.do((function_name, parameters_key(tool_call.get("parameters"))), query)
+    # A shared result carries the system name of the call that ran it
+    result = {**result, "system_name": tool_call.get("system_name", "未知系統")}
+
+    # Hallucinated names share one label, so the metric cardinality stays bounded
+    label = function_name if function_name in crud.TOOLS else "unknown"
+    metrics.TOOL_CALLS.inc(function_name=label)
+    metrics.TOOL_SECONDS.observe(time.perf_counter() - started, function_name=label)
+    if "error" in result:
+        metrics.TOOL_ERRORS.inc(function_name=label)
+    else:
+        metrics.TOOL_ROWS.inc(len(result["data"]), function_name=label)
+    return result
+
+
+async def execute_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Runs all tool calls concurrently, so the event loop is never blocked
+    and a multi-system question costs about as much as its slowest query.
+    Results are returned in the same order as `tool_calls`.
+    """
+    return await asyncio.gather(
+        *(run_tool_call(tool_call) for tool_call in tool_calls)
+    )
+
+
+# QnA cache and intent router counters
+@app.get("/api/qna/stats")
+def qna_stats():
+    return {
+        "response_cache": response_cache.stats(),
+        "intent_router": intent_router.stats(),
+        "catalog": catalog.stats(),
+        "catalog_index": catalog_index.stats(),
+        "tool_registry": tool_registry.stats(),
+        "query_cache": query_cache.stats(),
+        "vector_index": index_stats(),
+        "llm": assistant.provider.stats(),
+        "coalescing": {
+            "intent": assistant.intent_flight.stats(),
+            "answer": assistant.answer_flight.stats(),
+            "tool": tool_flight.stats(),
+        },
+    }
+
+# Connection pool usage and checkout wait times
+@app.get("/api/db/stats")
+def db_stats():
+    return pool_stats()
+
+# Cache, router and pool counters are read at scrape time
+metrics.registry.gauges_from("qna_response_cache", response_cache.stats)
+metrics.registry.gauges_from("qna_intent_router", intent_router.stats)
+metrics.registry.gauges_from("qna_catalog", catalog.stats)
+metrics.registry.gauges_from("qna_catalog_index", catalog_index.stats)
+metrics.registry.gauges_from("qna_tool_registry", tool_registry.stats)
+metrics.registry.gauges_from("query_cache", query_cache.stats)
+metrics.registry.gauges_from("qna_vector_index", index_stats)
+metrics.registry.gauges_from("db_pool", pool_stats)
+metrics.registry.gauges_from("qna_llm", lambda: assistant.provider.stats())
+metrics.registry.gauges_from("qna_coalesce_intent", assistant.intent_flight.stats)
+metrics.registry.gauges_from("qna_coalesce_answer", assistant.answer_flight.stats)
+metrics.registry.gauges_from("qna_coalesce_tool", tool_flight.stats)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# QnA endpoint latency and the optional Server-Timing header; the other routes are not wrapped
+app.add_middleware(metrics.QnATimingMiddleware, paths=("/api/qna/", "/api/qna/stream/"))
+
+async def resolve_intent(user_prompt: str, db) -> dict:
+    """Runs the fast-path intent router, falling back to the first LLM call. `db` is an async session."""
+    # --- Fast path: resolve plain "open application" requests without the LLM ---
+    with span("catalog"):
+        snapshot = await catalog.get_async(db)
+    with span("intent_router"):
+        llm_response_parsed = intent_router.route(user_prompt, snapshot)
+
+    # --- First LLM Call: Process user query for intent and parameters ---
+    if llm_response_parsed is None:
+        llm_response_parsed = await assistant.get_question_scope(
+            user_prompt=user_prompt, db=db
+        )
+    return llm_response_parsed
+
+
+def open_application_response(llm_response_parsed: dict, llm_initial_text_response: str) -> dict:
+    frontend_route_name = llm_response_parsed.get("frontend_route_name")
+    if frontend_route_name:
+        return {
+            "request_type": "OPEN_APPLICATION",
+            "llm_text_response": llm_initial_text_response,
+            "frontend_route_name": frontend_route_name
+        }
+    return {
+        "request_type": "UNKNOWN",
+        "llm_text_response": "抱歉，我無法識別要開啟哪個應用程式。請提供更明確的名稱。"
+    }
+
+
+def compact_for_llm(combined_tool_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fits the tool results into the summarization token budget (see compaction.py)."""
+    with span("compaction"):
+        return compact_tool_results(combined_tool_results, filter_hints=tool_registry.filter_hints())
+
+
 # LLM Q&A Endpoint
 @app.post("/api/qna/")
-async def qna_endpoint(request: Request, db: Session = Depends(get_db)):
+async def qna_endpoint(request: Request, db=Depends(get_async_db)):
     user_data = await request.json()
     user_prompt = user_data.get("user_prompt")
 
     if not user_prompt:
         raise HTTPException(status_code=400, detail="User prompt is required.")
 
-    # --- First LLM Call: Process user query for intent and parameters ---
-    llm_response_parsed = await assistant.get_question_scope(
-        user_prompt=user_prompt, db=db
-    )
+    llm_response_parsed = await resolve_intent(user_prompt, db)
 
     request_type = llm_response_parsed.get("request_type", "UNKNOWN")
     llm_initial_text_response = llm_response_parsed.get("llm_text_response", "未能從LLM獲取文字回應。")
 
     if request_type == "OPEN_APPLICATION":
-        frontend_route_name = llm_response_parsed.get("frontend_route_name")
-        if frontend_route_name:
-            return {
-                "request_type": "OPEN_APPLICATION",
-                "llm_text_response": llm_initial_text_response,
-                "frontend_route_name": frontend_route_name
-            }
-        else:
-            return {
-                "request_type": "UNKNOWN",
-                "llm_text_response": "抱歉，我無法識別要開啟哪個應用程式。請提供更明確的名稱。"
-            }
+        return open_application_response(llm_response_parsed, llm_initial_text_response)
     
     elif request_type == "ASK_SYSTEM_QUESTION":
         tool_calls = llm_response_parsed.get("tool_calls", [])
 
         combined_tool_results = []
-        data_too_large = False
-        guidance_message = ""
 
         # Execute recommended tool functions with extracted parameters
         if tool_calls and isinstance(tool_calls, list):
-            for tool_call in tool_calls:
-                function_name = tool_call.get("function_name")
-                parameters = tool_call.get("parameters", {})
-                system_name = tool_call.get("system_name", "未知系統") # LLM now provides system_name
-
-                # The `system_info` object from SYSTEM_INFO_MAP contains filterable_columns
-                system_info = SYSTEM_INFO_MAP.get(function_name)
-                # Fallback to DB lookup if not found in map (e.g. if added after startup)
-                if not system_info:
-                    system_info = crud.get_system_info(db, system_name=system_name) or \
-                                 next((info for info in crud.get_all_system_info(db) if info.data_query_function_name == function_name), None)
-                    if system_info:
-                        SYSTEM_INFO_MAP[function_name] = system_info
-
-
-                if function_name:
-                    tool_func = FUNCTION_MAP.get(function_name)
-                    if not tool_func and hasattr(crud, function_name):
-                        potential_func = getattr(crud, function_name)
-                        if inspect.isfunction(potential_func):
-                            tool_func = potential_func
-                            FUNCTION_MAP[function_name] = tool_func
-
-                if tool_func:
-                    try:
-                        # Check if tool_func expects a 'filters' argument
-                        if 'filters' in inspect.signature(tool_func).parameters:
-                            data = tool_func(db=db, filters=parameters)
-                        else: # Fallback for functions not yet updated with filters
-                            data = tool_func(db=db) 
-
-                        # Dynamically get the Pydantic schema for data validation
-                        schema_map = {
-                            "get_employees": schemas.Employee,
-                            "get_orders": schemas.Order,
-                            "get_all_system_info": schemas.SystemInfo,
-                        }
-                        ItemSchema = schema_map.get(function_name)
-                        
-                        formatted_data = []
-                        if ItemSchema:
-                            formatted_data = [ItemSchema.model_validate(item).model_dump() for item in data]
-                        else:
-                            # Fallback: Just convert SQLAlchemy model to dict if no schema found
-                            print(f"DEBUG: No schema found for {function_name}, using generic dict conversion.")
-                            formatted_data = [
-                                {c.name: getattr(item, c.name) for c in item.__table__.columns} 
-                                if hasattr(item, '__table__') else str(item)
-                                for item in data
-                            ]
-
-                        print(f"DEBUG: Successfully retrieved {len(formatted_data)} records for {system_name}.")
-                        
-                        # Check data size before adding to results
-                        data_str = json.dumps(formatted_data, ensure_ascii=False)
-                        if len(data_str) > CONTEXT_LENGTH_LIMIT:
-                            data_too_large = True
-                            filterable_cols = system_info.filterable_columns if system_info and system_info.filterable_columns else "無"
-                            guidance_message = (
-                                f"您查詢的 '{system_name}' 資料量過大，無法直接回答。\n"
-                                f"請提供更具體的篩選條件，您可以針對以下欄位進行篩選：{filterable_cols}"
-                            )
-                            # We break here because one oversized result is enough to stop
-                            break 
-                        
-                        combined_tool_results.append({
-                            "system_name": system_name,
-                            "function_name": function_name,
-                            "data": formatted_data
-                        })
-                    except Exception as e:
-                        print(f"DEBUG: Error executing {function_name}: {str(e)}")
-                        combined_tool_results.append({
-                            "system_name": system_name,
-                            "function_name": function_name,
-                            "error": f"執行函數 '{function_name}' 失敗: {str(e)}"
-                        })
-                else:
-                    print(f"DEBUG: Function '{function_name}' not found in FUNCTION_MAP or crud.")
-                    combined_tool_results.append({
-                        "system_name": system_name,
-                        "function_name": function_name,
-                        "error": f"LLM推薦的函數 '{function_name}' 不存在或未被映射。"
-                    })
-
-        # --- Second LLM Call: Summarize data or return guidance ---
-        print(f"DEBUG: Combined results for summarization: {len(combined_tool_results)} tool calls.")
-        if data_too_large:
-            final_llm_response = guidance_message
+            combined_tool_results = await execute_tool_calls(tool_calls)
+
+        # --- Second LLM Call: Summarize the compacted data ---
+        logger.debug("Combined results for summarization: %d tool calls.", len(combined_tool_results))
+        # Function-calling pipeline: counts, single rows and empty results need no second call
+        templated_answer = assistant.template_answer(combined_tool_results) if combined_tool_results else None
+        if templated_answer is not None:
+            final_llm_response = templated_answer
         elif combined_tool_results:
             final_llm_response = await assistant.get_llm_final_answer(
-                user_prompt, combined_tool_results
+                user_prompt, compact_for_llm(combined_tool_results), tool_calls
             )
         else:
-            print("DEBUG: No tool calls were executed, using initial LLM response.")
+            logger.debug("No tool calls were executed, using initial LLM response.")
             final_llm_response = llm_initial_text_response # If no tool_calls, use initial LLM response
 
-        return {
-            "request_type": "ASK_SYSTEM_QUESTION",
-            "llm_text_response": final_llm_response,
-            "tool_result": combined_tool_results if not data_too_large else None
-        }
+        # Tool rows are spliced in from their cached encoding instead of re-encoded by FastAPI
+        with span("encode"):
+            content = encode({
+                "request_type": "ASK_SYSTEM_QUESTION",
+                "llm_text_response": final_llm_response,
+                "tool_result": combined_tool_results
+            })
+        return Response(content=content, media_type="application/json")
 
     else: # UNKNOWN or other request_type
         return {
@@ -233,7 +421,83 @@ async def qna_endpoint(request: Request, db: Session = Depends(get_db)):
             "llm_text_response": llm_initial_text_response
         }
 
-# async def qna_endpoint(request: Request, db: Session = Depends(get_db)):
+
+def _ndjson(event: str, **payload) -> bytes:
+    return encode({"event": event, **payload}) + b"\n"
+
+
+# Streaming LLM Q&A Endpoint (NDJSON, one event per line)
+# Events, in order:
+#   intent       - request_type and the initial llm_text_response
+#   tool_result  - one per tool call as soon as it completes (`index` is its position in tool_calls)
+#   answer_delta - chunks of the final answer as the LLM streams it (one chunk when templated)
+#   done         - the complete response, same shape as /api/qna/
+@app.post("/api/qna/stream/")
+async def qna_stream_endpoint(request: Request):
+    user_data = await request.json()
+    user_prompt = user_data.get("user_prompt")
+
+    if not user_prompt:
+        raise HTTPException(status_code=400, detail="User prompt is required.")
+
+    async def event_stream():
+        # The session is owned by the generator, since it outlives the request handler
+        async with async_session() as db:
+            llm_response_parsed = await resolve_intent(user_prompt, db)
+
+        request_type = llm_response_parsed.get("request_type", "UNKNOWN")
+        llm_initial_text_response = llm_response_parsed.get("llm_text_response", "未能從LLM獲取文字回應。")
+        yield _ndjson("intent", request_type=request_type, llm_text_response=llm_initial_text_response)
+
+        if request_type == "OPEN_APPLICATION":
+            yield _ndjson("done", **open_application_response(llm_response_parsed, llm_initial_text_response))
+            return
+
+        if request_type != "ASK_SYSTEM_QUESTION":
+            yield _ndjson("done", request_type="UNKNOWN", llm_text_response=llm_initial_text_response)
+            return
+
+        tool_calls = llm_response_parsed.get("tool_calls", [])
+        combined_tool_results: List[Dict[str, Any]] = []
+        if tool_calls and isinstance(tool_calls, list):
+            async def run_indexed(index: int, tool_call: Dict[str, Any]):
+                return index, await run_tool_call(tool_call)
+
+            combined_tool_results = [None] * len(tool_calls)
+            for next_done in asyncio.as_completed([run_indexed(i, tc) for i, tc in enumerate(tool_calls)]):
+                index, result = await next_done
+                combined_tool_results[index] = result
+                yield _ndjson("tool_result", index=index, **result)
+
+        templated_answer = assistant.template_answer(combined_tool_results) if combined_tool_results else None
+        if templated_answer is not None:
+            final_llm_response = templated_answer
+            yield _ndjson("answer_delta", text=final_llm_response)
+        elif combined_tool_results:
+            chunks = []
+            answer = assistant.stream_llm_final_answer(user_prompt, compact_for_llm(combined_tool_results), tool_calls)
+            async for chunk in answer:
+                chunks.append(chunk)
+                yield _ndjson("answer_delta", text=chunk)
+            final_llm_response = "".join(chunks)
+        else:
+            final_llm_response = llm_initial_text_response
+            yield _ndjson("answer_delta", text=final_llm_response)
+
+        yield _ndjson(
+            "done",
+            request_type="ASK_SYSTEM_QUESTION",
+            llm_text_response=final_llm_response,
+            tool_result=combined_tool_results,
+        )
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# async def qna_endpoint(request: Request, db=Depends(get_async_db)):
 #     user_data = await request.json()
 #     user_prompt = user_data.get("user_prompt")
 
@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds: from a cached lookup up to a slow Gemini call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Adds a Server-Timing header with the per-stage breakdown to /api/qna/ responses
+TIMING_HEADER = os.getenv("QNA_TIMING_HEADER", "false").lower() in ("1", "true", "yes")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}" for key, value in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            for bound, count in zip(self.buckets, state):
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {_number(state[-2])}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Counters and histograms plus gauges read from existing `stats()` methods at scrape time."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._gauge_sources: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauges_from(self, prefix: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        """Exports every numeric value of `stats()` as the gauge `<prefix>_<key>`."""
+        self._gauge_sources.append((prefix, stats))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for prefix, stats in self._gauge_sources:
+            for key, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram("qna_request_seconds", "QnA request latency", ("endpoint",))
+STAGE_SECONDS = registry.histogram("qna_stage_seconds", "Latency of each QnA pipeline stage", ("stage",))
+TOOL_SECONDS = registry.histogram("qna_tool_seconds", "Tool function latency", ("function_name",))
+TOOL_CALLS = registry.counter("qna_tool_calls_total", "Tool function calls", ("function_name",))
+TOOL_ERRORS = registry.counter("qna_tool_errors_total", "Tool function errors", ("function_name",))
+TOOL_ROWS = registry.counter("qna_tool_rows_total", "Rows returned by tool functions", ("function_name",))
+LLM_CALLS = registry.counter("qna_llm_calls_total", "LLM calls", ("call",))
+LLM_ERRORS = registry.counter("qna_llm_errors_total", "Failed LLM calls", ("call",))
+LLM_CHARS = registry.counter("qna_llm_chars_total", "Characters sent to / received from the LLM", ("call", "direction"))
+TEMPLATED_ANSWERS = registry.counter("qna_templated_answers_total", "Answers rendered from the tool results without an LLM call")
+LLM_TOKENS = registry.counter("qna_llm_tokens_total", "Tokens sent to / received from the LLM (usage metadata)", ("call", "direction"))
+
+# Spans of the current request, collected for the Server-Timing header
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("qna_request_spans", default=None)
+
+
+def start_request() -> List[Tuple[str, float]]:
+    """Starts collecting spans for the current request (tasks and threads it spawns included)."""
+    spans: List[Tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times a pipeline stage into qna_stage_seconds and the current request's breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def record_llm_usage(call: str, prompt: str, response_text: str, usage: Any = None) -> None:
+    """Character counts of one LLM call, plus token counts when the response reports usage."""
+    LLM_CHARS.inc(len(prompt), call=call, direction="sent")
+    LLM_CHARS.inc(len(response_text), call=call, direction="received")
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, call=call, direction="sent")
+        LLM_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, call=call, direction="received")
+
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value; repeated stages (e.g. several tool calls) are summed."""
+    totals: Dict[str, List[float]] = {}
+    for stage, elapsed in spans:
+        total = totals.setdefault(stage, [0.0, 0])
+        total[0] += elapsed
+        total[1] += 1
+    return ", ".join(
+        f'{stage};dur={elapsed * 1000:.1f}' + (f';desc="x{count}"' if count > 1 else "")
+        for stage, (elapsed, count) in totals.items()
+    )
+
+
+class QnATimingMiddleware:
+    """
+    ASGI middleware timing the requests to `paths` into qna_request_seconds; with TIMING_HEADER
+    set, adds the per-stage Server-Timing breakdown. The endpoint label is one of `paths`, so
+    the series stay bounded, and every other route passes straight through.
+    """
+
+    def __init__(self, app: Any, paths: Sequence[str]):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        endpoint = scope["path"]
+        spans = start_request()
+        started = time.perf_counter()
+
+        async def send_timed(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                # For the streaming endpoint this is the time to the first byte
+                elapsed = time.perf_counter() - started
+                REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+                if TIMING_HEADER and spans:
+                    value = server_timing(spans + [("total", elapsed)])
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_timed)
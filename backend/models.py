@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, String, Text
 from .database import Base
 
 class Employee(Base):
     __tablename__ = "employees"
+    # Ids are never reused, so the vector index can track new rows by the highest indexed id
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(String, unique=True, index=True, nullable=False)
@@ -15,10 +17,13 @@ class Employee(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    # Ids are never reused (see Employee)
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(String, unique=True, index=True, nullable=False)
-    order_date = Column(String, nullable=False)
+    # Stored as 'YYYY-MM-DD' text; filtered as a date, so "2024-03" or ranges hit the index
+    order_date = Column(String, index=True, nullable=False, info={"filter_type": "date"})
     order_amount = Column(Integer, nullable=True) # Added order_amount field
 
 class SystemInfo(Base):
@@ -29,3 +34,19 @@ class SystemInfo(Base):
     data_query_function_name = Column(String, nullable=False)
     filterable_columns = Column(String, nullable=True) # Stores a JSON list of strings
     frontend_route_name = Column(String, nullable=True) # New field for frontend routing
+
+class DataVersion(Base):
+    """Change counter per table, shared by all workers (see crud/versions.py)."""
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class QnACacheEntry(Base):
+    """Rows of the `database` QnA cache backend (see response_cache.py)."""
+    __tablename__ = "qna_cache"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(Float, nullable=False)
+    accessed_at = Column(Float, nullable=False, index=True)
@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+# Read-through cache of tool call and list endpoint results
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE", "true").lower() in ("1", "true", "yes")
+QUERY_CACHE_MAXSIZE = int(os.getenv("QUERY_CACHE_MAXSIZE", "1024"))
+# Upper bound on the summed JSON size of the cached results
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+T = TypeVar("T")
+
+
+class QueryCache:
+    """
+    LRU cache of query results keyed by (table, table version, key), where the version is the
+    table's change counter in data_versions (crud.versions). The crud write functions bump it
+    in the same transaction as the write, so a result is served exactly until its table
+    changes, in every worker. Entries of older versions are dropped as soon as a newer
+    version of their table is seen.
+
+    Bounded by entry count and by `max_bytes`, the summed size of the entries as reported by
+    the `weight` of each `get_or_load` call (their encoded JSON size).
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_MAXSIZE, max_bytes: int = QUERY_CACHE_MAX_BYTES,
+                 enabled: bool = QUERY_CACHE_ENABLED):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int, Hashable], Tuple[Any, int]]" = OrderedDict()
+        self._latest: Dict[str, int] = {}
+        self._bytes = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "oversized": 0}
+
+    def _drop(self, key: Tuple[str, int, Hashable]) -> None:
+        _, weight = self._entries.pop(key)
+        self._bytes -= weight
+
+    def _observe(self, table: str, version: int) -> None:
+        """Drops the entries of `table` older than `version` the first time it is seen."""
+        if version <= self._latest.get(table, -1):
+            return
+        self._latest[table] = version
+        stale = [key for key in self._entries if key[0] == table and key[1] < version]
+        for key in stale:
+            self._drop(key)
+        if stale:
+            self._counters["invalidations"] += len(stale)
+
+    def get_or_load(self, table: str, version: int, key: Hashable, load: Callable[[], T],
+                    weight: Callable[[T], int]) -> T:
+        """The cached result for `key` at `version` of `table`, else `load()` (which is then cached)."""
+        if not self.enabled:
+            return load()
+        entry_key = (table, version, key)
+        with self._lock:
+            self._observe(table, version)
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                self._entries.move_to_end(entry_key)
+                self._counters["hits"] += 1
+                return entry[0]
+            self._counters["misses"] += 1
+
+        value = load()
+        size = weight(value)
+        with self._lock:
+            if size > self.max_bytes:
+                self._counters["oversized"] += 1
+                return value
+            # A reader still on an older version does not bring its stale result back
+            if version < self._latest.get(table, -1):
+                return value
+            if entry_key in self._entries:
+                self._drop(entry_key)
+            self._entries[entry_key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._counters["evictions"] += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        total = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+        stats["enabled"] = int(self.enabled)
+        return stats
+
+
+query_cache = QueryCache()
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import asyncio
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Trailing punctuation that does not change the meaning of a question
+_TRAILING_PUNCTUATION = "。．.？?！!~～ "
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Folds width/case/whitespace differences so trivially different prompts share a cache entry."""
+    text = unicodedata.normalize("NFKC", prompt or "")
+    text = _WHITESPACE_RE.sub(" ", text).strip().lower()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+def hash_payload(payload: Any) -> str:
+    """Stable hash of a JSON-serializable payload (e.g. the combined tool results)."""
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """Per-process LRU cache with a TTL. Values are stored as strings."""
+
+    # Calls are cheap dict operations, made directly on the event loop
+    blocking = False
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """
+    LRU cache with a TTL stored in a local SQLite file, so several uvicorn workers
+    on the same machine share one cache. The least recently used entries beyond `maxsize`
+    are trimmed every `trim_every` writes instead of on each one.
+    """
+
+    # File I/O: ResponseCache runs the calls in a worker thread
+    blocking = True
+
+    def __init__(self, path: str, maxsize: int = 1024, ttl: float = 300.0, trim_every: int = 64):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.trim_every = trim_every
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_accessed_at ON response_cache (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._writes += 1
+            if self._writes % self.trim_every == 0:
+                conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+                # accessed_at of the maxsize-th most recent entry (indexed); everything older goes
+                cutoff = conn.execute(
+                    "SELECT accessed_at FROM response_cache ORDER BY accessed_at DESC LIMIT 1 OFFSET ?",
+                    (self.maxsize,),
+                ).fetchone()
+                if cutoff is not None:
+                    conn.execute("DELETE FROM response_cache WHERE accessed_at <= ?", (cutoff[0],))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM response_cache")
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class DatabaseCacheBackend:
+    """
+    LRU cache with a TTL in the application database (table `qna_cache`), so workers on
+    different machines share one cache. The least recently used entries beyond `maxsize`
+    are trimmed every `trim_every` writes instead of on each one.
+    """
+
+    # Database I/O: ResponseCache runs the calls in a worker thread
+    blocking = True
+
+    def __init__(self, engine, table, maxsize: int = 1024, ttl: float = 300.0, trim_every: int = 64):
+        self.engine = engine
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.trim_every = trim_every
+        self._writes = 0
+
+    def _upsert(self, conn, row: Dict[str, Any]) -> None:
+        dialect = conn.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = (postgresql if dialect == "postgresql" else sqlite).insert(self.table)
+            conn.execute(insert.on_conflict_do_update(
+                index_elements=[self.table.c.key],
+                set_={"value": insert.excluded.value, "expires_at": insert.excluded.expires_at, "accessed_at": insert.excluded.accessed_at},
+            ), row)
+            return
+        conn.execute(delete(self.table).where(self.table.c.key == row["key"]))
+        conn.execute(self.table.insert(), row)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        table = self.table
+        with self.engine.begin() as conn:
+            row = conn.execute(select(table.c.value, table.c.expires_at).where(table.c.key == key)).first()
+            if row is None:
+                return None
+            if row.expires_at < now:
+                conn.execute(delete(table).where(table.c.key == key))
+                return None
+            conn.execute(update(table).where(table.c.key == key).values(accessed_at=now))
+            return row.value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        table = self.table
+        with self.engine.begin() as conn:
+            self._upsert(conn, {"key": key, "value": value, "expires_at": now + self.ttl, "accessed_at": now})
+            self._writes += 1
+            if self._writes % self.trim_every == 0:
+                conn.execute(delete(table).where(table.c.expires_at < now))
+                # accessed_at of the maxsize-th most recent entry; everything older goes
+                cutoff = conn.execute(
+                    select(table.c.accessed_at).order_by(table.c.accessed_at.desc()).offset(self.maxsize).limit(1)
+                ).scalar()
+                if cutoff is not None:
+                    conn.execute(delete(table).where(table.c.accessed_at <= cutoff))
+
+    def clear(self) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table))
+
+    def __len__(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar()
+
+
+class ResponseCache:
+    """
+    Two-level QnA cache:
+    - intent: normalized prompt + catalog version -> parsed `get_question_scope` result
+    - answer: normalized prompt + hash of the tool results -> final LLM answer
+
+    The get/set methods are awaited; calls to a blocking backend run in a worker thread
+    so a cache lookup never stalls the event loop.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"intent_hits": 0, "intent_misses": 0, "answer_hits": 0, "answer_misses": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def intent_key(user_prompt: str, catalog_version: int) -> str:
+        return f"intent:{catalog_version}:{normalize_prompt(user_prompt)}"
+
+    @staticmethod
+    def answer_key(user_prompt: str, tool_results: Any) -> str:
+        return f"answer:{hash_payload(tool_results)}:{normalize_prompt(user_prompt)}"
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get_intent(self, user_prompt: str, catalog_version: int) -> Optional[dict]:
+        value = await self._call(self.backend.get, self.intent_key(user_prompt, catalog_version))
+        self._count("intent_hits" if value is not None else "intent_misses")
+        return json.loads(value) if value is not None else None
+
+    async def set_intent(self, user_prompt: str, catalog_version: int, intent: dict) -> None:
+        await self._call(self.backend.set, self.intent_key(user_prompt, catalog_version), json.dumps(intent, ensure_ascii=False))
+
+    async def get_answer(self, user_prompt: str, tool_results: Any) -> Optional[str]:
+        value = await self._call(self.backend.get, self.answer_key(user_prompt, tool_results))
+        self._count("answer_hits" if value is not None else "answer_misses")
+        return value
+
+    async def set_answer(self, user_prompt: str, tool_results: Any, answer: str) -> None:
+        await self._call(self.backend.set, self.answer_key(user_prompt, tool_results), answer)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        for level in ("intent", "answer"):
+            total = stats[f"{level}_hits"] + stats[f"{level}_misses"]
+            stats[f"{level}_hit_ratio"] = stats[f"{level}_hits"] / total if total else 0.0
+        stats["backend"] = type(self.backend).__name__
+        stats["size"] = len(self.backend)
+        return stats
+
+
+def create_response_cache() -> ResponseCache:
+    """
+    Builds the cache from QNA_CACHE_* environment variables: in-process memory by default
+    (one cache per worker), `sqlite` for a file shared by the workers of one machine, or
+    `database` to share it between machines. The shared backends are opt-in, since every
+    lookup then costs a round trip through a worker thread.
+    """
+    backend_name = os.getenv("QNA_CACHE_BACKEND", "memory").lower()
+    maxsize = int(os.getenv("QNA_CACHE_MAXSIZE", "1024"))
+    ttl = float(os.getenv("QNA_CACHE_TTL", "300"))
+
+    if backend_name == "sqlite":
+        path = os.getenv("QNA_CACHE_PATH", "./qna_cache.db")
+        return ResponseCache(SQLiteCacheBackend(path, maxsize=maxsize, ttl=ttl))
+    if backend_name == "database":
+        from .database import engine
+        from .models import QnACacheEntry
+        return ResponseCache(DatabaseCacheBackend(engine, QnACacheEntry.__table__, maxsize=maxsize, ttl=ttl))
+    return ResponseCache(MemoryCacheBackend(maxsize=maxsize, ttl=ttl))
+
+
+response_cache = create_response_cache()
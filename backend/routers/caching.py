@@ -0,0 +1,61 @@
+import hashlib
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from .. import crud
+from ..crud import Page
+from ..query_cache import query_cache
+from ..serialization import RowSet
+from ..singleflight import parameters_key
+from .pagination import cursor_headers
+
+# Clients may keep the body, but must revalidate it (If-None-Match) before each reuse
+CACHE_CONTROL = "no-cache"
+
+
+def list_etag(table: str, version: int, key: str) -> str:
+    """Weak ETag of one list page: the table's version plus a hash of the query parameters."""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    return f'W/"{table}-{version}-{digest}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or etag[2:] in tags
+
+
+async def cached_list(request: Request, db, model, schema, params: Dict[str, Any],
+                      load: Callable[[Session], Tuple[Iterable[Any], Optional[Page]]]) -> Response:
+    """
+    Serves one list page through the query cache, with an ETag from the table's version:
+    a client sending it back in If-None-Match gets 304 until the table is written to.
+    `load(db)` returns the rows (ORM objects) and, for keyset paging, their Page.
+    """
+    table = model.__tablename__
+    key = parameters_key(params)
+    if_none_match = request.headers.get("if-none-match")
+    fields = list(schema.model_fields)
+
+    def lookup(session: Session):
+        def fetch() -> Tuple[RowSet, Dict[str, str]]:
+            items, page = load(session)
+            rows = RowSet(fields, [tuple(getattr(item, field) for field in fields) for item in items])
+            return rows, cursor_headers(page) if page is not None else {}
+
+        # Version first: data read after it is at least as new as the version it is cached under
+        version = crud.get_version(session, table)
+        etag = list_etag(table, version, key)
+        if _etag_matches(if_none_match, etag):
+            return etag, None
+        return etag, query_cache.get_or_load(table, version, ("list", key), fetch, weight=lambda entry: len(entry[0].json))
+
+    etag, entry = await db.run_sync(lookup)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if entry is None:
+        return Response(status_code=304, headers=headers)
+    rows, page_headers = entry
+    return Response(content=rows.json, media_type="application/json", headers={**page_headers, **headers})
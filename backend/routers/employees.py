@@ -1,26 +1,69 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas
-from ..database import get_db
+from .. import bulk_io, crud, models, schemas
+from ..database import SessionLocal, get_db, get_async_db
+from .caching import cached_list
 
 router = APIRouter()
 
 @router.post("/employees/", response_model=schemas.Employee, status_code=status.HTTP_201_CREATED)
-def create_employee(employee: schemas.EmployeeCreate, db: Session = Depends(get_db)):
-    db_employee = crud.get_employee(db, employee_id=employee.employee_id)
+async def create_employee(employee: schemas.EmployeeCreate, db=Depends(get_async_db)):
+    db_employee = await crud.aio.get_employee(db, employee_id=employee.employee_id)
     if db_employee:
         raise HTTPException(status_code=400, detail="Employee ID already registered")
-    return crud.create_employee(db=db, employee=employee)
+    return await crud.aio.create_employee(db, employee=employee)
 
 @router.get("/employees/", response_model=List[schemas.Employee])
-def read_employees(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    employees = crud.get_employees(db, skip=skip, limit=limit)
-    return employees
+async def read_employees(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                         sort: str = "id", db=Depends(get_async_db)):
+    def load(sync_db: Session):
+        # Offset paging is kept for existing clients; it gets slower the deeper the page
+        if skip:
+            return crud.get_employees(sync_db, skip=skip, limit=limit), None
+
+        # Keyset paging: pass back X-Next-Cursor / X-Prev-Cursor as `cursor` to move between pages
+        page = crud.get_employees_page(sync_db, cursor=cursor, sort=sort, limit=limit)
+        return page.items, page
+
+    # Served from the query cache until the table changes; If-None-Match gets 304 until then
+    params = {"skip": skip, "limit": limit, "cursor": cursor, "sort": sort}
+    try:
+        return await cached_list(request, db, models.Employee, schemas.Employee, params, load)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/employees/bulk")
+async def import_employees(request: Request, db: Session = Depends(get_db)):
+    """Bulk import from a streamed text/csv (with header row) or application/x-ndjson body."""
+    return await bulk_io.import_records(
+        request, schemas.EmployeeCreate, "employee_id",
+        lambda batch: crud.bulk_create_employees(db, batch),
+    )
+
+@router.get("/employees/export")
+def export_employees(format: str = "csv"):
+    if format not in bulk_io.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(bulk_io.EXPORT_FORMATS)}")
+
+    def generate():
+        # Owned by the generator, which keeps reading after the handler has returned
+        db = SessionLocal()
+        try:
+            yield from bulk_io.export_lines(crud.iter_employees(db), schemas.Employee, format)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type=bulk_io.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="employees.{format}"'},
+    )
 
 @router.delete("/employees/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_employee(employee_id: str, db: Session = Depends(get_db)):
-    if not crud.delete_employee(db=db, employee_id=employee_id):
+async def delete_employee(employee_id: str, db=Depends(get_async_db)):
+    if not await crud.aio.delete_employee(db, employee_id=employee_id):
         raise HTTPException(status_code=404, detail="Employee not found")
     return {"ok": True}
@@ -1,26 +1,69 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas
-from ..database import get_db
+from .. import bulk_io, crud, models, schemas
+from ..database import SessionLocal, get_db, get_async_db
+from .caching import cached_list
 
 router = APIRouter()
 
 @router.post("/orders/", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
-    db_order = crud.get_order(db, order_id=order.order_id)
+async def create_order(order: schemas.OrderCreate, db=Depends(get_async_db)):
+    db_order = await crud.aio.get_order(db, order_id=order.order_id)
     if db_order:
         raise HTTPException(status_code=400, detail="Order ID already registered")
-    return crud.create_order(db=db, order=order)
+    return await crud.aio.create_order(db, order=order)
 
 @router.get("/orders/", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    orders = crud.get_orders(db, skip=skip, limit=limit)
-    return orders
+async def read_orders(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                      sort: str = "id", db=Depends(get_async_db)):
+    def load(sync_db: Session):
+        # Offset paging is kept for existing clients; it gets slower the deeper the page
+        if skip:
+            return crud.get_orders(sync_db, skip=skip, limit=limit), None
+
+        # Keyset paging: pass back X-Next-Cursor / X-Prev-Cursor as `cursor` to move between pages
+        page = crud.get_orders_page(sync_db, cursor=cursor, sort=sort, limit=limit)
+        return page.items, page
+
+    # Served from the query cache until the table changes; If-None-Match gets 304 until then
+    params = {"skip": skip, "limit": limit, "cursor": cursor, "sort": sort}
+    try:
+        return await cached_list(request, db, models.Order, schemas.Order, params, load)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/orders/bulk")
+async def import_orders(request: Request, db: Session = Depends(get_db)):
+    """Bulk import from a streamed text/csv (with header row) or application/x-ndjson body."""
+    return await bulk_io.import_records(
+        request, schemas.OrderCreate, "order_id",
+        lambda batch: crud.bulk_create_orders(db, batch),
+    )
+
+@router.get("/orders/export")
+def export_orders(format: str = "csv"):
+    if format not in bulk_io.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(bulk_io.EXPORT_FORMATS)}")
+
+    def generate():
+        # Owned by the generator, which keeps reading after the handler has returned
+        db = SessionLocal()
+        try:
+            yield from bulk_io.export_lines(crud.iter_orders(db), schemas.Order, format)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type=bulk_io.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
 
 @router.delete("/orders/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_order(order_id: str, db: Session = Depends(get_db)):
-    if not crud.delete_order(db=db, order_id=order_id):
+async def delete_order(order_id: str, db=Depends(get_async_db)):
+    if not await crud.aio.delete_order(db, order_id=order_id):
         raise HTTPException(status_code=404, detail="Order not found")
     return {"ok": True}
@@ -0,0 +1,17 @@
+from typing import Dict
+
+from ..crud import Page
+
+# The list endpoints keep returning a plain JSON array; cursors travel in these headers
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+CURSOR_HEADERS = [NEXT_CURSOR_HEADER, PREV_CURSOR_HEADER]
+
+
+def cursor_headers(page: Page) -> Dict[str, str]:
+    headers = {}
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    if page.prev_cursor:
+        headers[PREV_CURSOR_HEADER] = page.prev_cursor
+    return headers
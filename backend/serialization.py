@@ -0,0 +1,59 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the standard library encoder
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON; uses orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(",", ":")).encode("utf-8")
+
+
+class RowSet:
+    """
+    Query result as column names plus row tuples, straight from `select(columns)`.
+    The JSON encoding is produced once and reused by every consumer (LLM prompt, HTTP
+    response, stream events), instead of validating and dumping each row per consumer.
+    """
+
+    __slots__ = ("columns", "rows", "_json")
+
+    def __init__(self, columns: Sequence[str], rows: List[Tuple[Any, ...]]):
+        self.columns = tuple(columns)
+        self.rows = rows
+        self._json: Optional[bytes] = None
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict[str, Any]]) -> "RowSet":
+        items = list(items)
+        columns = list(items[0].keys()) if items else []
+        return cls(columns, [tuple(item.get(c) for c in columns) for item in items])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    @property
+    def json(self) -> bytes:
+        """The rows as a JSON array of objects (the shape `tool_result.data` always had)."""
+        if self._json is None:
+            self._json = dumps(self.as_dicts())
+        return self._json
+
+
+def encode(obj: Any) -> bytes:
+    """JSON-encodes `obj`, splicing in the cached encoding of any RowSet it contains."""
+    if isinstance(obj, RowSet):
+        return obj.json
+    if isinstance(obj, dict):
+        return b"{" + b",".join(dumps(str(k)) + b":" + encode(v) for k, v in obj.items()) + b"}"
+    if isinstance(obj, (list, tuple)):
+        return b"[" + b",".join(encode(v) for v in obj) + b"]"
+    return dumps(obj)
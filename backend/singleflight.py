@@ -0,0 +1,64 @@
+import os
+import json
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+# Concurrent identical QnA prompts / tool queries share one LLM call or DB query
+COALESCE_ENABLED = os.getenv("QNA_COALESCE", "true").lower() in ("1", "true", "yes")
+
+T = TypeVar("T")
+
+
+def parameters_key(parameters: Any) -> str:
+    """Order-insensitive key for LLM-extracted tool parameters."""
+    return json.dumps(parameters or {}, ensure_ascii=False, sort_keys=True, default=str)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls with the same key: the first caller (the leader) starts
+    the call, callers arriving while it is in flight await the same result (or exception).
+    Nothing is kept once the call completes; caching is left to response_cache.
+
+    The call runs as its own task, so a leader whose request is cancelled (client gone)
+    does not cancel the call for the callers sharing it.
+    """
+
+    def __init__(self, enabled: bool = COALESCE_ENABLED):
+        self.enabled = enabled
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "shared": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Marks the exception as retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            return await func()
+        task = self._calls.get(key)
+        if task is None:
+            self._count("leaders")
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            self._count("shared")
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        total = stats["leaders"] + stats["shared"]
+        stats["shared_ratio"] = stats["shared"] / total if total else 0.0
+        stats["in_flight"] = len(self._calls)
+        return stats
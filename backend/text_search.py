@@ -0,0 +1,101 @@
+import logging
+from typing import Dict, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+# Text columns served by the substring index, per table
+SEARCH_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "employees": ("name", "address", "email", "phone"),
+}
+
+# Set by `setup_text_search`: "fts5" (SQLite), "pg_trgm" (Postgres) or None (plain LIKE scans)
+backend = None
+
+
+def fts_table_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """`create_all` skips existing tables, so indexes added to models later are created here."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _setup_sqlite_fts5(engine: Engine) -> bool:
+    with engine.begin() as conn:
+        try:
+            conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x, tokenize='trigram')"))
+            conn.execute(text("DROP TABLE temp.fts5_probe"))
+        except OperationalError:
+            logger.warning("SQLite build has no FTS5 trigram tokenizer, substring filters will scan.")
+            return False
+
+        for table_name, columns in SEARCH_COLUMNS.items():
+            fts = fts_table_name(table_name)
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}
+            ).first()
+            column_list = ", ".join(columns)
+            new_values = ", ".join(f"new.{c}" for c in columns)
+            old_values = ", ".join(f"old.{c}" for c in columns)
+
+            # External-content table: the text lives in `table_name`, the FTS table only holds the index
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"{column_list}, content='{table_name}', content_rowid='id', tokenize='trigram')"
+            ))
+            # Keep the index in sync on insert/delete/update
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+                f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+            ))
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table_name} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+            ))
+            if not exists:
+                # Index the rows that were there before the FTS table existed
+                conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    return True
+
+
+def _setup_pg_trgm(engine: Engine) -> bool:
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for table_name, columns in SEARCH_COLUMNS.items():
+                for column in columns:
+                    # LIKE '%value%' uses a trigram GIN index directly; Postgres maintains it on writes
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{column}_trgm "
+                        f"ON {table_name} USING gin ({column} gin_trgm_ops)"
+                    ))
+    except Exception as e:
+        logger.warning("Could not set up pg_trgm indexes, substring filters will scan: %s", e)
+        return False
+    return True
+
+
+def setup_text_search(engine: Engine) -> None:
+    """Creates the substring search indexes for the current database (call after `create_all`)."""
+    global backend
+    ensure_indexes(engine)
+    if engine.dialect.name == "sqlite":
+        backend = "fts5" if _setup_sqlite_fts5(engine) else None
+    elif engine.dialect.name == "postgresql":
+        backend = "pg_trgm" if _setup_pg_trgm(engine) else None
+    else:
+        backend = None
+    logger.info("Text search backend: %s", backend or "LIKE scan")
@@ -0,0 +1,95 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from . import crud
+from .catalog import CatalogSnapshot, SystemEntry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Tool:
+    """A registered query function (crud.TOOLS) bound to its catalog entry, if it has one."""
+    spec: crud.ToolSpec
+    system: Optional[SystemEntry]
+
+    def split_parameters(self, parameters: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        (keyword arguments, column filters) of one LLM tool call. Parameters the LLM may set
+        (spec.llm_parameters: metric/column/group_by, query/top_k) are arguments; `limit` is
+        always TOOL_ROW_LIMIT + 1 (the extra row tells a cut-off result from a complete one) and
+        `skip` is dropped. Everything else is a column filter, limited to the columns the catalog
+        lists as filterable.
+        """
+        arguments = {k: v for k, v in parameters.items() if k in self.spec.llm_parameters}
+        if "limit" in self.spec.parameters:
+            arguments["limit"] = crud.TOOL_ROW_LIMIT + 1
+        if not self.spec.accepts_filters:
+            return arguments, None
+        filters = {k: v for k, v in parameters.items() if k not in self.spec.parameters}
+        crud.check_filterable(filters, self.system.filterable_columns if self.system else ())
+        return arguments, filters
+
+
+class ToolRegistry:
+    """
+    Function name -> Tool for the current catalog version, so a tool call is dispatched with
+    one dict lookup. Rebuilt on the first lookup after a /api/system_info/ write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = -1
+        self._tools: Dict[str, Tool] = {}
+        self._filter_hints: Dict[str, str] = {}
+        self._counters = {"builds": 0, "lookups": 0, "unknown": 0}
+
+    def sync(self, snapshot: CatalogSnapshot) -> Dict[str, Tool]:
+        if self._version != snapshot.version:
+            with self._lock:
+                if self._version != snapshot.version:
+                    self._build(snapshot)
+        return self._tools
+
+    def _build(self, snapshot: CatalogSnapshot) -> None:
+        systems: Dict[str, SystemEntry] = {}
+        for entry in snapshot.systems:
+            systems.setdefault(entry.data_query_function_name, entry)
+        tools = {name: Tool(spec, systems.get(name)) for name, spec in crud.TOOLS.items()}
+        self._filter_hints = {
+            name: tool.system.filterable_columns_raw
+            for name, tool in tools.items()
+            if tool.system and tool.system.filterable_columns_raw
+        }
+        # Published before the version, so a reader that sees the new version sees these tools
+        self._tools = tools
+        self._version = snapshot.version
+        self._counters["builds"] += 1
+        missing = sorted(name for name in systems if name not in tools)
+        if missing:
+            logger.warning("Catalog functions without a registered crud tool: %s", missing)
+
+    def get(self, snapshot: CatalogSnapshot, function_name: Optional[str]) -> Optional[Tool]:
+        tool = self.sync(snapshot).get(function_name)
+        with self._lock:
+            self._counters["lookups"] += 1
+            if tool is None:
+                self._counters["unknown"] += 1
+        return tool
+
+    def filter_hints(self) -> Dict[str, str]:
+        """Function name -> raw filterable_columns of its catalog entry, for the compaction notes."""
+        return self._filter_hints
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats: Dict[str, object] = dict(self._counters)
+        tools = self._tools
+        stats["tools"] = len(tools)
+        stats["cataloged"] = sum(1 for tool in tools.values() if tool.system is not None)
+        return stats
+
+
+tool_registry = ToolRegistry()
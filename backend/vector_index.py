@@ -0,0 +1,265 @@
+import os
+import re
+import json
+import time
+import zlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: without it semantic search is disabled
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: no directory locking, one worker is assumed
+    fcntl = None
+
+from .response_cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+# Semantic row search (see crud/semantic.py); needs numpy
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() in ("1", "true", "yes") and np is not None
+# One sub-directory of memory-mapped files per table
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "./vector_index")
+# Hashed feature space; 256 float32 dimensions is 1 KiB per row
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))
+
+# Bumped whenever the features change, so stale on-disk vectors are rebuilt
+EMBEDDER_VERSION = "hashing-v1"
+INITIAL_CAPACITY = 1024
+# Seconds between background catch-ups of the indexes with rows written elsewhere (bulk
+# imports, other workers); 0 only catches up once at startup
+VECTOR_INDEX_SYNC_INTERVAL = float(os.getenv("VECTOR_INDEX_SYNC_INTERVAL", "5"))
+# Seconds between meta.json rewrites while rows are being added; flush() always writes it
+META_WRITE_INTERVAL = float(os.getenv("VECTOR_INDEX_META_INTERVAL", "5"))
+
+_WORD_RE = re.compile(r"[a-z0-9@._-]+|[㐀-鿿]+")
+
+
+class HashingEmbedder:
+    """
+    CPU-only text embedding without a model: character n-grams are hashed (crc32, stable
+    across processes) into `dim` buckets and the vector is L2-normalized. Buckets are not
+    signed, so a hash collision can only add similarity, never cancel a shared n-gram.
+    CJK text contributes unigrams and bigrams, latin words themselves plus their trigrams,
+    so partial names, addresses and e-mail fragments still land close to the full value.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+
+    @staticmethod
+    def features(text: str) -> List[Tuple[str, float]]:
+        features: List[Tuple[str, float]] = []
+        for word in _WORD_RE.findall(normalize_prompt(text)):
+            if word.isascii():
+                features.append((word, 1.0))
+                features += [(word[i:i + 3], 0.5) for i in range(len(word) - 2)] if len(word) > 3 else []
+            else:
+                features += [(char, 0.5) for char in word]
+                features += [(word[i:i + 2], 1.0) for i in range(len(word) - 1)]
+        return features
+
+    def embed(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dim] += weight
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+class VectorIndex:
+    """
+    Persistent, memory-mapped vector index for the rows of one table.
+
+    Files in `path`: `vectors.f32` (capacity x dim float32), `ids.i64` (the row id of each slot,
+    -1 for a deleted row) and `meta.json` (dim, embedder, used slots, highest indexed id).
+    Rows are appended; deletes leave a tombstone that is compacted away once tombstones
+    outnumber live rows. Search is one matrix-vector product over the mapped vectors.
+
+    The watermark relies on row ids never being reused (AUTOINCREMENT on SQLite, see models.py).
+    meta.json is rewritten at most every META_WRITE_INTERVAL seconds by `add`: after a crash
+    the index reopens with an older count and watermark, and the rows past them are re-embedded.
+    """
+
+    def __init__(self, path: str, embedder: HashingEmbedder):
+        self.path = path
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self._lock = threading.Lock()
+        self._slots: Dict[int, int] = {}
+        self.count = 0
+        self.watermark = 0
+        self._meta_dirty = False
+        self._meta_written_at = 0.0
+        os.makedirs(path, exist_ok=True)
+        self._open()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _open(self) -> None:
+        meta = {}
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta.get("dim") != self.dim or meta.get("embedder") != EMBEDDER_VERSION:
+            if meta:
+                logger.info("Vector index %s was built with other settings, rebuilding.", self.path)
+            meta = {}
+            for name in ("vectors.f32", "ids.i64"):
+                with open(self._file(name), "wb"):
+                    pass
+        self.count = meta.get("count", 0)
+        self.watermark = meta.get("watermark", 0)
+        self._map(max(INITIAL_CAPACITY, self.count))
+        live = self.ids[:self.count]
+        self._slots = {int(row_id): slot for slot, row_id in enumerate(live.tolist()) if row_id >= 0}
+
+    def _map(self, capacity: int) -> None:
+        """(Re)maps both files with room for `capacity` rows, growing them when needed."""
+        for name, row_bytes in (("vectors.f32", 4 * self.dim), ("ids.i64", 8)):
+            with open(self._file(name), "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self.ids = np.memmap(self._file("ids.i64"), dtype=np.int64, mode="r+", shape=(capacity,))
+        self.capacity = capacity
+
+    def _write_meta(self) -> None:
+        meta = {"dim": self.dim, "embedder": EMBEDDER_VERSION, "count": self.count, "watermark": self.watermark}
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_dirty = False
+        self._meta_written_at = time.monotonic()
+
+    def add(self, items: Iterable[Tuple[int, str]]) -> int:
+        """Embeds and stores (row id, text) pairs; an id that is already indexed is overwritten."""
+        embedded = [(row_id, self.embedder.embed(text)) for row_id, text in items]
+        if not embedded:
+            return 0
+        with self._lock:
+            new_rows = sum(1 for row_id, _ in embedded if row_id not in self._slots)
+            if self.count + new_rows > self.capacity:
+                self.vectors.flush()
+                self._map(max(self.capacity * 2, self.count + new_rows))
+            for row_id, vector in embedded:
+                slot = self._slots.get(row_id)
+                if slot is None:
+                    slot = self._slots[row_id] = self.count
+                    self.count += 1
+                self.vectors[slot] = vector
+                self.ids[slot] = row_id
+                self.watermark = max(self.watermark, row_id)
+            self._meta_dirty = True
+            if time.monotonic() - self._meta_written_at >= META_WRITE_INTERVAL:
+                self._write_meta()
+        return len(embedded)
+
+    def remove(self, row_ids: Iterable[int]) -> None:
+        with self._lock:
+            for row_id in row_ids:
+                slot = self._slots.pop(row_id, None)
+                if slot is not None:
+                    self.ids[slot] = -1
+                    self.vectors[slot] = 0
+            if self.count - len(self._slots) > max(INITIAL_CAPACITY, len(self._slots)):
+                self._compact()
+
+    def _compact(self) -> None:
+        live = np.flatnonzero(self.ids[:self.count] >= 0)
+        self.vectors[:len(live)] = self.vectors[live]
+        self.ids[:len(live)] = self.ids[live]
+        self.ids[len(live):self.count] = -1
+        self.count = len(live)
+        self._slots = {int(row_id): slot for slot, row_id in enumerate(self.ids[:self.count].tolist())}
+        self._write_meta()
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """The `k` most similar rows as (row id, cosine similarity), best first."""
+        vector = self.embedder.embed(query)
+        with self._lock:
+            count = self.count
+            if not count or not vector.any():
+                return []
+            scores = self.vectors[:count] @ vector
+            ids = np.array(self.ids[:count])
+        scores[ids < 0] = -np.inf
+        k = min(k, len(self._slots))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(ids[slot]), float(scores[slot])) for slot in best if scores[slot] > 0]
+
+    def flush(self) -> None:
+        with self._lock:
+            self.vectors.flush()
+            self.ids.flush()
+            if self._meta_dirty:
+                self._write_meta()
+
+    def stats(self) -> Dict[str, object]:
+        return {"rows": len(self._slots), "slots": self.count, "capacity": self.capacity, "watermark": self.watermark}
+
+
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+# Lock files of the claimed index directories, held for the life of the process
+_directory_locks = []
+
+
+def _claim_directory(path: str) -> str:
+    """
+    The first of `path`, `path.1`, `path.2`, ... not in use by another live process. The index
+    files are written without cross-process coordination, so each uvicorn worker keeps its own
+    copy (each catches up on the rows written by the others through the watermark).
+    """
+    if fcntl is None:
+        return path
+    for slot in range(64):
+        candidate = path if slot == 0 else f"{path}.{slot}"
+        os.makedirs(candidate, exist_ok=True)
+        lock = open(os.path.join(candidate, "lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        _directory_locks.append(lock)
+        return candidate
+    raise RuntimeError(f"No free vector index directory for {path}")
+
+
+def get_index(table_name: str) -> Optional[VectorIndex]:
+    """The index of `table_name`, opened on first use; None when semantic search is disabled."""
+    if not VECTOR_INDEX_ENABLED:
+        return None
+    index = _indexes.get(table_name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(table_name)
+            if index is None:
+                path = _claim_directory(os.path.join(VECTOR_INDEX_DIR, table_name))
+                index = _indexes[table_name] = VectorIndex(path, HashingEmbedder())
+    return index
+
+
+def index_stats() -> Dict[str, object]:
+    stats: Dict[str, object] = {"enabled": int(VECTOR_INDEX_ENABLED)}
+    for table_name, index in list(_indexes.items()):
+        for key, value in index.stats().items():
+            stats[f"{table_name}_{key}"] = value
+    return stats
+
+
+def flush_indexes() -> None:
+    for index in list(_indexes.values()):
+        index.flush()
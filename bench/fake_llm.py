@@ -0,0 +1,179 @@
+"""
+Local stand-in for `genai.GenerativeModel`, so the QnA pipeline can be benchmarked offline.
+
+Only the surface ERPAssistant uses is implemented: `generate_content_async(messages, stream=...)`
+returning an object with `.text` / `.parts` / `.usage_metadata`, or an async iterator of chunks.
+With function declarations (QNA_PIPELINE=function_calling) the canned tool calls are returned as
+function call parts under `.candidates`, the way GeminiProvider reads them.
+"""
+import json
+import random
+import asyncio
+from typing import Any, Dict, List, Optional
+
+# The summarization prompt embeds the tool data under this label (see ERPAssistant._build_summarization_prompt)
+SUMMARIZATION_MARKER = "查詢到的數據"
+
+# Canned intent replies, picked by keyword in the user question (first match wins)
+INTENTS: List[Dict[str, Any]] = [
+    {
+        "keywords": ("幾筆", "多少筆"),
+        "reply": {
+            "request_type": "ASK_SYSTEM_QUESTION",
+            "llm_text_response": "好的，我會為您計算訂單筆數。",
+            "tool_calls": [{"system_name": "訂單統計", "function_name": "aggregate_orders",
+                            "parameters": {"metric": "count", "order_date": "2024-03"}}],
+        },
+    },
+    {
+        "keywords": ("總金額", "統計", "平均"),
+        "reply": {
+            "request_type": "ASK_SYSTEM_QUESTION",
+            "llm_text_response": "好的，我會為您統計訂單金額。",
+            "tool_calls": [{"system_name": "訂單統計", "function_name": "aggregate_orders",
+                            "parameters": {"metric": "sum", "column": "order_amount", "group_by": "order_month"}}],
+        },
+    },
+    {
+        "keywords": ("訂單",),
+        "reply": {
+            "request_type": "ASK_SYSTEM_QUESTION",
+            "llm_text_response": "好的，我會為您查詢訂單資料。",
+            "tool_calls": [{"system_name": "訂單管理", "function_name": "get_orders",
+                            "parameters": {"order_date": "2024-03"}}],
+        },
+    },
+    {
+        "keywords": ("員工", "地址"),
+        "reply": {
+            "request_type": "ASK_SYSTEM_QUESTION",
+            "llm_text_response": "好的，我會為您查詢員工資料。",
+            "tool_calls": [{"system_name": "員工管理", "function_name": "get_employees",
+                            "parameters": {"address": "台北市"}}],
+        },
+    },
+]
+UNKNOWN_REPLY = {"request_type": "UNKNOWN", "llm_text_response": "抱歉，我無法理解您的問題。", "tool_calls": []}
+ANSWER = "根據查詢結果，符合條件的資料共有數筆，主要集中在台北市，金額分布平均。"
+
+
+class UsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeFunctionCall:
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+
+    @staticmethod
+    def to_dict(call: "FakeFunctionCall") -> Dict[str, Any]:
+        return {"name": call.name, "args": call.args}
+
+
+class FakePart:
+    """A content part; `"function_call" in part` works as on the proto message."""
+
+    def __init__(self, text: str = "", function_call: Optional[FakeFunctionCall] = None):
+        self.text = text
+        self.function_call = function_call
+
+    def __contains__(self, field: str) -> bool:
+        return field == "function_call" and self.function_call is not None
+
+
+class FakeCandidate:
+    def __init__(self, parts: List[FakePart]):
+        self.content = FakeContent(parts)
+
+
+class FakeContent:
+    def __init__(self, parts: List[FakePart]):
+        self.parts = parts
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_chars: int = 0, function_calls: Optional[List[FakeFunctionCall]] = None):
+        self.text = text
+        self.parts = [text]
+        if function_calls:
+            self.candidates = [FakeCandidate([FakePart(function_call=call) for call in function_calls])]
+        # Rough token counts, the same order of magnitude Gemini reports for CJK text
+        self.usage_metadata = UsageMetadata(prompt_chars // 2, len(text) // 2)
+
+
+class FakeStream:
+    def __init__(self, text: str, chunk_chars: int, chunk_delay: float, prompt_chars: int):
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.usage_metadata = UsageMetadata(prompt_chars // 2, len(text) // 2)
+
+    async def __aiter__(self):
+        for i in range(0, len(self.text), self.chunk_chars):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield FakeResponse(self.text[i:i + self.chunk_chars])
+
+
+class FakeGenerativeModel:
+    """
+    `latency` (seconds, with +/- `jitter` fraction) is awaited per call, like a network round
+    trip; streamed answers additionally wait `chunk_delay` between `chunk_chars`-sized chunks.
+    """
+
+    model_name = "models/fake-bench"
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.2, chunk_chars: int = 8,
+                 chunk_delay: float = 0.01, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def _intent(prompt: str) -> Dict[str, Any]:
+        question = prompt.rsplit("用戶問題:", 1)[-1]
+        for intent in INTENTS:
+            if any(keyword in question for keyword in intent["keywords"]):
+                return intent["reply"]
+        return UNKNOWN_REPLY
+
+    def _reply(self, prompt: str) -> str:
+        if SUMMARIZATION_MARKER in prompt:
+            return ANSWER
+        return json.dumps(self._intent(prompt), ensure_ascii=False)
+
+    def _function_calls(self, prompt: str, tools: Optional[list], tool_config: Optional[dict]) -> List[FakeFunctionCall]:
+        """The canned intent's tool calls to declared functions, when the call may make any."""
+        mode = ((tool_config or {}).get("function_calling_config") or {}).get("mode", "AUTO")
+        if not tools or mode == "NONE":
+            return []
+        declared = {declaration["name"] for tool in tools for declaration in tool.get("function_declarations", ())}
+        return [
+            FakeFunctionCall(call["function_name"], call.get("parameters") or {})
+            for call in self._intent(prompt)["tool_calls"]
+            if call["function_name"] in declared
+        ]
+
+    async def generate_content_async(self, messages, stream: bool = False, tools: Optional[list] = None,
+                                     tool_config: Optional[dict] = None, **kwargs):
+        self.calls += 1
+        # Text parts only; a function response part means this is the answer call of a conversation
+        texts = [part if isinstance(part, str) else part.get("text", "") for message in messages for part in message["parts"]]
+        answering = any(isinstance(part, dict) and "function_response" in part
+                        for message in messages for part in message["parts"])
+        prompt = "".join(texts)
+        if self.latency:
+            await asyncio.sleep(self.latency * (1 + self._random.uniform(-self.jitter, self.jitter)))
+        function_calls = [] if answering else self._function_calls(prompt, tools, tool_config)
+        if function_calls:
+            return FakeResponse("", len(prompt), function_calls)
+        text = ANSWER if answering else self._reply(prompt)
+        if stream:
+            return FakeStream(text, self.chunk_chars, self.chunk_delay, len(prompt))
+        return FakeResponse(text, len(prompt))
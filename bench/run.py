@@ -0,0 +1,264 @@
+"""
+Offline load benchmark for the QnA pipeline and the list endpoints.
+
+The app runs in-process (httpx ASGITransport, no network) against a seeded SQLite database,
+with ERPAssistant's Gemini model replaced by `bench.fake_llm.FakeGenerativeModel` (behind the
+usual ResilientProvider, so the LLM concurrency cap and deadlines are part of the measurement).
+
+    python -m bench.run --rows 1000 --requests 500 --concurrency 20
+    python -m bench.run --rows 100000 --scenarios qna,qna_stream --llm-latency 0.5
+    python -m bench.run --rows 1000 --save-baseline      # record bench/baselines.json
+    python -m bench.run --pipeline function_calling      # QNA_PIPELINE=function_calling
+
+Seeded databases are kept under bench/data/ and reused when the row counts match.
+Results are compared against the stored baseline for the same scenario and row count;
+the exit status is 1 when a p95 regresses by more than --tolerance. With the function-calling
+pipeline, a count question is first checked to be answered by `template_answer` without a
+second LLM call (also exit status 1 when it is not).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINES_PATH = BENCH_DIR / "baselines.json"
+SCENARIOS = ("qna", "qna_stream", "employees", "orders")
+SEED_BATCH = 10_000
+
+QNA_PROMPTS = ("台北市的員工有哪些", "2024年3月的訂單", "每個月訂單總金額統計", "打開員工管理")
+# Answered from a single aggregate row, so the function-calling pipeline needs no answer call
+COUNT_PROMPT = "2024年3月的訂單有幾筆"
+PIPELINES = ("two_call", "function_calling")
+SYSTEMS = [
+    {"system_name": "員工管理", "data_query_function_name": "get_employees",
+     "filterable_columns": '["name", "address", "age", "gender"]', "frontend_route_name": "employees"},
+    {"system_name": "訂單管理", "data_query_function_name": "get_orders",
+     "filterable_columns": '["order_id", "order_date", "order_amount"]', "frontend_route_name": "orders"},
+    {"system_name": "訂單統計", "data_query_function_name": "aggregate_orders",
+     "filterable_columns": '["order_date", "order_amount"]', "frontend_route_name": "orders"},
+]
+CITIES = ("台北市", "新北市", "台中市", "台南市", "高雄市", "新竹市")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="employees and orders to seed (e.g. 1000, 100000, 1000000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake Gemini round trip in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="latency jitter as a fraction")
+    parser.add_argument("--llm-concurrency", type=int, help="in-flight LLM call cap (default: LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="two_call", help="QnA pipeline (QNA_PIPELINE)")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="repeat identical prompts (measures the response cache instead of the LLM path)")
+    parser.add_argument("--db", help="SQLite file (default: bench/data/bench_<rows>.db)")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression vs. baseline")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace) -> Path:
+    """Must run before `backend` is imported: the engine and caches are built from these at import time."""
+    db_path = Path(args.db) if args.db else BENCH_DIR / "data" / f"bench_{args.rows}.db"
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LLM_PROVIDER", "gemini")
+    if args.llm_concurrency:
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.llm_concurrency)
+    os.environ["QNA_PIPELINE"] = args.pipeline
+    sys.path.insert(0, str(BENCH_DIR.parent))
+    return db_path
+
+
+def seed_database(rows: int, rng: random.Random) -> None:
+    from backend import crud, models
+    from backend.catalog import catalog
+    from backend.crud.bulk import bulk_insert
+    from backend.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for system in SYSTEMS:
+            if not crud.get_system_info(db, system["system_name"]):
+                db.add(models.SystemInfo(**system))
+        db.commit()
+        catalog.invalidate()
+
+        have_employees = db.query(models.Employee).count()
+        have_orders = db.query(models.Order).count()
+        if have_employees >= rows and have_orders >= rows:
+            return
+        print(f"Seeding {rows} employees and orders ...", flush=True)
+        started = time.perf_counter()
+        for start in range(have_employees, rows, SEED_BATCH):
+            bulk_insert(db, models.Employee, "employee_id", [
+                {"employee_id": f"E{i:07d}", "name": f"員工{i}", "phone": f"09{i:08d}",
+                 "address": f"{rng.choice(CITIES)}中正路{i % 500}號", "email": f"e{i}@example.com",
+                 "gender": rng.choice("MF"), "age": rng.randint(20, 65)}
+                for i in range(start, min(start + SEED_BATCH, rows))
+            ])
+        for start in range(have_orders, rows, SEED_BATCH):
+            bulk_insert(db, models.Order, "order_id", [
+                {"order_id": f"O{i:07d}", "order_date": f"202{rng.randint(3, 5)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                 "order_amount": rng.randint(100, 100_000)}
+                for i in range(start, min(start + SEED_BATCH, rows))
+            ])
+        print(f"Seeded in {time.perf_counter() - started:.1f}s", flush=True)
+    finally:
+        db.close()
+
+
+def build_request(scenario: str, i: int, args: argparse.Namespace, rng: random.Random):
+    """(method, url, json body) for request number `i` of a scenario."""
+    if scenario in ("qna", "qna_stream"):
+        prompt = QNA_PROMPTS[i % len(QNA_PROMPTS)]
+        if not args.warm_cache:
+            # A distinct suffix defeats the response cache, so every request takes the LLM path
+            prompt = f"{prompt} #{scenario}-{i}"
+        url = "/api/qna/" if scenario == "qna" else "/api/qna/stream/"
+        return "POST", url, {"user_prompt": prompt}
+    sort = rng.choice(("id", "employee_id", "name") if scenario == "employees" else ("id", "order_id", "order_date"))
+    return "GET", f"/api/{scenario}/?limit=100&sort={sort}", None
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, scenario: str, args: argparse.Namespace, rng: random.Random) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(args.requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, url, body = build_request(scenario, i, args, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        # ru_maxrss is in KiB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+async def check_templated_answer(client, fake_model) -> List[str]:
+    """
+    A count question must be answered from the aggregate's single row by `template_answer`,
+    i.e. with the intent call only. Returns the failures.
+    """
+    calls = fake_model.calls
+    # A distinct suffix keeps the intent off the response cache
+    response = await client.post("/api/qna/", json={"user_prompt": f"{COUNT_PROMPT} #check-{time.time_ns()}"})
+    answer = response.json().get("llm_text_response", "") if response.status_code == 200 else ""
+    failures = []
+    if not answer.startswith("符合條件的"):
+        failures.append(f"count question was not answered from the template (status {response.status_code}): {answer!r}")
+    if fake_model.calls - calls != 1:
+        failures.append(f"count question made {fake_model.calls - calls} LLM calls, expected 1 (the intent call)")
+    return failures
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], args: argparse.Namespace) -> List[str]:
+    baselines = json.loads(BASELINES_PATH.read_text(encoding="utf-8")) if BASELINES_PATH.exists() else {}
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if not baseline:
+            continue
+        allowed = baseline["p95_ms"] * (1 + args.tolerance)
+        if result["p95_ms"] > allowed:
+            regressions.append(f"{key}: p95 {result['p95_ms']}ms > baseline {baseline['p95_ms']}ms (+{args.tolerance:.0%})")
+    if args.save_baseline:
+        baselines.update(results)
+        BASELINES_PATH.write_text(json.dumps(baselines, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline saved to {BASELINES_PATH}")
+    return regressions
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    import httpx
+    from bench.fake_llm import FakeGenerativeModel
+    from backend import main as app_module
+    from backend.llm_providers import GeminiProvider, ResilientProvider
+
+    rng = random.Random(args.seed)
+    seed_database(args.rows, rng)
+    fake_model = FakeGenerativeModel(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed)
+    app_module.assistant.provider = ResilientProvider(GeminiProvider(model=fake_model))
+    # ASGITransport does not run startup events
+    await app_module.startup_event()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios {sorted(unknown)}, expected a subset of {SCENARIOS}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    failures: List[str] = []
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        if args.pipeline == "function_calling":
+            failures = await check_templated_answer(client, fake_model)
+        for scenario in scenarios:
+            result = await run_scenario(client, scenario, args, rng)
+            # The default pipeline keeps the keys of the existing baselines
+            key = f"{scenario}:{args.rows}" if args.pipeline == "two_call" else f"{scenario}:{args.rows}:{args.pipeline}"
+            results[key] = result
+            print(f"{key:<22} {result['requests']:>6} req  {result['errors']:>4} err  {result['rps']:>8} rps  "
+                  f"p50 {result['p50_ms']:>8}ms  p95 {result['p95_ms']:>8}ms  p99 {result['p99_ms']:>8}ms  "
+                  f"rss {result['max_rss_mb']}MB", flush=True)
+
+    await app_module.shutdown_event()
+
+    regressions = compare_with_baseline(results, args)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    for failure in failures:
+        print(f"CHECK FAILED {failure}")
+    return 1 if regressions or failures else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())